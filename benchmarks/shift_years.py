@@ -0,0 +1,39 @@
+'''Benchmarks common.dates.shift_years against adding pd.DateOffset(years=1).
+
+Run from the repository root:
+
+	python -m benchmarks.shift_years [rows]
+'''
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from pipelines.common import dates
+
+
+def make_dates(rows: int, seed: int=0) -> pd.Series:
+	'''Returns random purchase dates over two years, including Feb 29 and some NaT'''
+	rng = np.random.default_rng(seed)
+	values = pd.Series(pd.Timestamp('2019-01-01') + pd.to_timedelta(rng.integers(0, 731, rows), unit='D'))
+	values[rng.random(rows) < 0.01] = pd.NaT
+
+	return values
+
+
+def main(rows: int=5000000, repeat: int=3):
+	values = make_dates(rows)
+
+	expected = values + pd.DateOffset(years=1)
+	pd.testing.assert_series_equal(dates.shift_years(values, 1), expected)
+
+	for name, func in (
+		('DateOffset', lambda: values + pd.DateOffset(years=1)),
+		('shift_years', lambda: dates.shift_years(values, 1))):
+		best = min(timeit.repeat(func, number=1, repeat=repeat))
+		print('%-12s %d rows, best of %d: %.3fs' % (name, rows, repeat, best))
+
+
+if __name__ == '__main__':
+	main(*[int(arg) for arg in sys.argv[1:2]])
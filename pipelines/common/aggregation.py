@@ -0,0 +1,163 @@
+import logging
+import numpy as np
+import os
+import pandas as pd
+import shutil
+import tempfile
+
+from typing import Iterator, List, Optional, Union
+
+# Create logger
+log = logging.getLogger(__name__)
+
+
+class RunningAggregate:
+	'''Sums value columns by key over partial aggregates that arrive one at a time.
+
+	Partials are buffered and compacted into the running total once the buffer holds
+	as many rows as the total (and at least ``compact_rows``), so memory stays bounded
+	by the number of distinct keys rather than by the number of partials.
+	'''
+
+	def __init__(self, keys: List[str], values: List[str], compact_rows: int=5000000):
+		self.keys = keys
+		self.values = values
+		self.compact_rows = compact_rows
+		self._total = None
+		self._buffer = []
+		self._buffered_rows = 0
+
+	def add(self, data: pd.DataFrame):
+		self._buffer.append(data[self.keys + self.values])
+		self._buffered_rows += len(data)
+
+		total_rows = 0 if self._total is None else len(self._total)
+		if self._buffered_rows >= max(self.compact_rows, total_rows):
+			self._compact()
+
+	def _compact(self):
+		frames = self._buffer if self._total is None else [self._total] + self._buffer
+		if not frames:
+			return
+
+		self._total = pd.concat(frames, ignore_index=True, sort=False) \
+			.groupby(self.keys, observed=True) \
+			.agg({col: 'sum' for col in self.values}) \
+			.reset_index()
+		self._buffer = []
+		self._buffered_rows = 0
+
+	def result(self) -> pd.DataFrame:
+		self._compact()
+		if self._total is None:
+			return pd.DataFrame(columns=self.keys + self.values)
+
+		return self._total
+
+
+class PartitionedAggregate:
+	'''Sums value columns by key like RunningAggregate, spilling to disk beyond a memory budget.
+
+	Partials are buffered in memory. Once the buffer outgrows the memory budget it is
+	aggregated, hash partitioned on the keys and every partition is appended to its own
+	files in the spill folder. Partitions are then aggregated one at a time, so only
+	the largest partition has to fit in memory besides the result.
+	'''
+
+	def __init__(
+		self,
+		keys: List[str],
+		values: List[str],
+		memory_budget_mb: int=1024,
+		spill_folder_path: Optional[str]=None,
+		partitions: int=16):
+
+		self.keys = keys
+		self.values = values
+		self.memory_budget = memory_budget_mb * 2**20
+		self.spill_folder_path = spill_folder_path
+		self.partitions = partitions
+		self._buffer = []
+		self._buffered_bytes = 0
+		self._spill_path = None
+		self._spills = 0
+
+	def add(self, data: pd.DataFrame):
+		data = data[self.keys + self.values]
+		self._buffer.append(data)
+		self._buffered_bytes += data.memory_usage(index=False, deep=True).sum()
+
+		if self._buffered_bytes > self.memory_budget:
+			self._spill()
+
+	def _aggregate(self, frames: List[pd.DataFrame]) -> pd.DataFrame:
+		return pd.concat(frames, ignore_index=True, sort=False) \
+			.groupby(self.keys, observed=True) \
+			.agg({col: 'sum' for col in self.values}) \
+			.reset_index()
+
+	def _spill(self):
+		if not self._buffer:
+			return
+
+		if self._spill_path is None:
+			if self.spill_folder_path is not None:
+				os.makedirs(self.spill_folder_path, exist_ok=True)
+			self._spill_path = tempfile.mkdtemp(prefix='aggregate-', dir=self.spill_folder_path)
+
+		data = self._aggregate(self._buffer)
+		self._buffer = []
+		self._buffered_bytes = 0
+
+		# Rows of a key always land in the same partition, whatever the integer width of the key
+		key_data = data[self.keys].astype({col: np.int64 for col in self.keys if pd.api.types.is_integer_dtype(data[col])})
+		partition = pd.util.hash_pandas_object(key_data, index=False).values % self.partitions
+		order = np.argsort(partition, kind='stable')
+		bounds = np.searchsorted(partition[order], np.arange(self.partitions + 1))
+		for p in range(self.partitions):
+			if bounds[p + 1] > bounds[p]:
+				part = data.iloc[order[bounds[p]:bounds[p + 1]]]
+				part.to_pickle(os.path.join(self._spill_path, '%03d-%05d.pkl' % (p, self._spills)))
+
+		log.info('Spilled %d aggregated rows to %s', len(data), self._spill_path)
+		self._spills += 1
+
+	def iter_partitions(self) -> Iterator[pd.DataFrame]:
+		'''Yields the aggregate one hash partition at a time, then removes the spilled files'''
+		if self._spill_path is None:
+			if self._buffer:
+				yield self._aggregate(self._buffer)
+				self._buffer = []
+			return
+
+		self._spill()
+		try:
+			files = sorted(os.listdir(self._spill_path))
+			for p in range(self.partitions):
+				prefix = '%03d-' % p
+				parts = [pd.read_pickle(os.path.join(self._spill_path, name)) for name in files if name.startswith(prefix)]
+				if parts:
+					yield self._aggregate(parts)
+		finally:
+			shutil.rmtree(self._spill_path, ignore_errors=True)
+			self._spill_path = None
+			self._spills = 0
+
+	def result(self) -> pd.DataFrame:
+		partitions = list(self.iter_partitions())
+		if not partitions:
+			return pd.DataFrame(columns=self.keys + self.values)
+
+		return pd.concat(partitions, ignore_index=True, sort=False)
+
+
+def create_aggregate(
+	keys: List[str],
+	values: List[str],
+	memory_budget_mb: Optional[int]=None,
+	spill_folder_path: Optional[str]=None) -> Union[RunningAggregate, PartitionedAggregate]:
+	'''Returns an in memory running aggregate, or a disk spilling one when a memory budget is set'''
+	if memory_budget_mb:
+		return PartitionedAggregate(keys, values, memory_budget_mb, spill_folder_path)
+
+	return RunningAggregate(keys, values)
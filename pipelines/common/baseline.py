@@ -0,0 +1,148 @@
+import logging
+import numpy as np
+import os
+import pandas as pd
+import shutil
+
+from typing import Callable, Dict, Optional
+
+# Create logger
+log = logging.getLogger(__name__)
+
+KEY_FILE = 'key'
+# Bump whenever the layout of the saved stores changes
+LAYOUT_VERSION = '1'
+META_FILE = 'meta.pkl'
+INDEX_FILE = 'index.npy'
+
+
+class BaselineStore:
+	'''Static prior-year rows, sorted by the date they were recorded on (the source date).
+
+	Rows are stored with their keys already shifted onto the year they are compared
+	with. Every column is a numpy array: text columns as int32 codes into their
+	categories, other columns as they are. A saved store is opened with memory mapped
+	arrays, so reading a window of source dates only touches the rows it returns, and
+	text columns are returned as categoricals over the stored codes, never decoded.
+	'''
+
+	def __init__(self, index: np.ndarray, columns: Dict[str, np.ndarray], categories: Dict[str, pd.Index]):
+		self.index = index
+		self.columns = columns
+		self.categories = categories
+
+	@classmethod
+	def from_frame(cls, data: pd.DataFrame, index_column: str) -> 'BaselineStore':
+		'''Builds a store from rows of data, indexed by the datetime ``index_column``'''
+		index = pd.to_datetime(data[index_column]).values.astype('datetime64[ns]')
+		order = np.argsort(index, kind='stable')
+
+		columns, categories = {}, {}
+		for col in data.columns:
+			if col == index_column:
+				continue
+
+			values = data[col]
+			if pd.api.types.is_numeric_dtype(values) or pd.api.types.is_datetime64_any_dtype(values):
+				columns[col] = np.asarray(values)[order]
+			else:
+				codes, uniques = pd.factorize(values)
+				columns[col] = codes.astype(np.int32)[order]
+				categories[col] = pd.Index(uniques)
+
+		return cls(index[order], columns, categories)
+
+	@property
+	def last_date(self) -> np.datetime64:
+		'''Returns the last source date, NaT when the store is empty'''
+		dates = self.index[~np.isnat(self.index)]
+		return dates[-1] if len(dates) else np.datetime64('NaT')
+
+	def window(self, start: Optional[str]=None, end: Optional[str]=None) -> pd.DataFrame:
+		'''Returns the rows with a source date from ``start`` (inclusive) to ``end`` (exclusive)'''
+		lo = 0 if start is None else np.searchsorted(self.index, np.datetime64(pd.Timestamp(start), 'ns'), 'left')
+		hi = len(self.index) if end is None else np.searchsorted(self.index, np.datetime64(pd.Timestamp(end), 'ns'), 'left')
+
+		frame = {}
+		for col, values in self.columns.items():
+			values = np.array(values[lo:hi])
+			if col in self.categories:
+				values = pd.Categorical.from_codes(values, categories=self.categories[col])
+			frame[col] = values
+
+		return pd.DataFrame(frame, columns=list(self.columns))
+
+	def encode(self, data: pd.DataFrame) -> pd.DataFrame:
+		'''Returns data with the text columns of the store as categoricals over the store's categories.
+
+		Values the store has not seen are appended to its categories, so stored codes stay
+		valid and windows read afterwards share the categories of the encoded frames.
+		'''
+		columns = {}
+		for col, categories in self.categories.items():
+			if col not in data.columns:
+				continue
+
+			uniques = pd.Index(pd.unique(data[col].dropna()))
+			unseen = uniques[categories.get_indexer(uniques) == -1]
+			if len(unseen):
+				self.categories[col] = categories = categories.append(unseen)
+			columns[col] = pd.Categorical(data[col], categories=categories)
+
+		return data.assign(**columns)
+
+	def save(self, store_folder_path: str):
+		os.makedirs(store_folder_path, exist_ok=True)
+		np.save(os.path.join(store_folder_path, INDEX_FILE), self.index)
+		for i, values in enumerate(self.columns.values()):
+			np.save(os.path.join(store_folder_path, '%03d.npy' % i), values)
+		pd.to_pickle({'columns': list(self.columns), 'categories': self.categories}, os.path.join(store_folder_path, META_FILE))
+
+	@classmethod
+	def open(cls, store_folder_path: str) -> 'BaselineStore':
+		'''Opens a saved store with memory mapped arrays'''
+		meta = pd.read_pickle(os.path.join(store_folder_path, META_FILE))
+		index = np.load(os.path.join(store_folder_path, INDEX_FILE), mmap_mode='r')
+		columns = {
+			col: np.load(os.path.join(store_folder_path, '%03d.npy' % i), mmap_mode='r')
+			for i, col in enumerate(meta['columns'])}
+
+		return cls(index, columns, meta['categories'])
+
+
+def load_baseline(
+	folder_path: Optional[str],
+	name: str,
+	version: str,
+	build: Callable[[], pd.DataFrame],
+	index_column: str) -> BaselineStore:
+	'''Opens the baseline store saved under name for the same version, else builds and saves it.
+
+	``version`` identifies the static input the store is built from (e.g. a version of
+	the source file), so opening a store never reads that input. ``build`` returns the
+	shifted prior-year rows, ``index_column`` holding their source date. Without a
+	folder the store is built in memory.
+	'''
+	if folder_path is None:
+		return BaselineStore.from_frame(build(), index_column)
+
+	key = '%s:%s' % (LAYOUT_VERSION, version)
+	store_folder_path = os.path.join(folder_path, name)
+	key_path = os.path.join(store_folder_path, KEY_FILE)
+	if os.path.exists(key_path):
+		with open(key_path) as f:
+			if f.read() == key:
+				log.info('Opening baseline store %s', name)
+				return BaselineStore.open(store_folder_path)
+
+	log.info('Building baseline store %s', name)
+	store = BaselineStore.from_frame(build(), index_column)
+
+	# Write the key last, so an interrupted run never pairs a key with a partial store
+	shutil.rmtree(store_folder_path, ignore_errors=True)
+	store.save(store_folder_path)
+	with open(key_path + '.tmp', 'w') as f:
+		f.write(key)
+	os.replace(key_path + '.tmp', key_path)
+
+	return BaselineStore.open(store_folder_path)
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+
+from typing import List, Tuple
+
+from . import dates
+from .encoding import encode_keys
+
+
+def align_previous_year(
+	current: pd.DataFrame,
+	previous: pd.DataFrame,
+	keys: List[str],
+	value: str,
+	previous_value: str) -> pd.DataFrame:
+	'''Outer joins current values with previous year values, already shifted onto this year's keys.
+
+	Keys are encoded to single integers over both frames and sorted once, and the values
+	of each side are summed per key, instead of hash merging on every key column. Returns
+	the keys with ``value`` and ``previous_value`` columns (0 where a side has no row),
+	current keys first.
+	'''
+	current_key, previous_key = encode_keys(current, previous, keys)
+	n_current = len(current)
+
+	uniques, first, inverse = np.unique(
+		np.concatenate([current_key, previous_key]), return_index=True, return_inverse=True)
+	inverse = inverse.ravel()
+	values = np.bincount(
+		inverse[:n_current], weights=np.nan_to_num(current[value].values.astype(float)), minlength=len(uniques))
+	previous_values = np.bincount(
+		inverse[n_current:], weights=np.nan_to_num(previous[value].values.astype(float)), minlength=len(uniques))
+
+	# Take the key values of every key from its first row, in the current frame if it is there
+	from_current = first < n_current
+	aligned = pd.concat(
+		[current[keys].iloc[first[from_current]], previous[keys].iloc[first[~from_current] - n_current]],
+		ignore_index=True,
+		sort=False)
+	order = np.concatenate([np.flatnonzero(from_current), np.flatnonzero(~from_current)])
+	aligned[value] = values[order]
+	aligned[previous_value] = previous_values[order]
+
+	return aligned
+
+
+def spread_months_to_days(
+	data: pd.DataFrame,
+	month_column: str,
+	date_column: str,
+	first_day: str,
+	last_day: str) -> pd.DataFrame:
+	'''Repeats every row of monthly data once per day of its month, between first_day and last_day.
+
+	Rows are repeated with np.repeat over the number of days of their month within the
+	range and dated by their offset from the month start, so no day outside the range
+	is ever created. The month column (month keys) is replaced by a datetime date column.
+	'''
+	first_day, last_day = np.datetime64(first_day, 'D'), np.datetime64(last_day, 'D')
+	keys = np.asarray(data[month_column], dtype=np.int64)
+	starts = np.maximum(dates.month_starts(keys).astype('datetime64[D]'), first_day)
+	ends = np.minimum(dates.month_starts(keys + 1).astype('datetime64[D]'), last_day + 1)
+	days = np.maximum((ends - starts).astype(np.int64), 0)
+	days[keys == dates.MISSING_MONTH] = 0
+
+	rows = np.repeat(np.arange(len(data)), days)
+	offsets = np.arange(len(rows)) - np.repeat(np.cumsum(days) - days, days)
+
+	spread = data.drop(columns=[month_column]).iloc[rows].reset_index(drop=True)
+	spread[date_column] = (starts[rows] + offsets).astype('datetime64[ns]')
+
+	return spread
+
+
+def lookup_previous_year(
+	current: pd.DataFrame,
+	previous: pd.DataFrame,
+	keys: List[str],
+	values: List[str]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+	'''Looks up previous year values, already shifted onto this year's keys, for every current row.
+
+	Previous rows are summed per encoded key into a sorted table, and every current row
+	finds its key there by binary search, so neither frame is merged with the other.
+	Returns the values of every current row (0 without a previous row, in current row
+	order) and the keys and values of previous keys no current row has.
+	'''
+	current_key, previous_key = encode_keys(current, previous, keys)
+	table, first, inverse = np.unique(previous_key, return_index=True, return_inverse=True)
+	inverse = inverse.ravel()
+	sums = {
+		col: np.bincount(inverse, weights=np.nan_to_num(previous[col].values.astype(float)), minlength=len(table))
+		for col in values}
+
+	position = np.searchsorted(table, current_key)
+	matched = position < len(table)
+	matched[matched] = table[position[matched]] == current_key[matched]
+	position = position[matched]
+
+	looked_up = {}
+	for col in values:
+		looked_up[col] = np.zeros(len(current))
+		looked_up[col][matched] = sums[col][position]
+
+	unmatched = np.ones(len(table), dtype=bool)
+	unmatched[position] = False
+	previous_only = previous[keys].iloc[first[unmatched]].reset_index(drop=True)
+	for col in values:
+		previous_only[col] = sums[col][unmatched]
+
+	return pd.DataFrame(looked_up, index=current.index), previous_only
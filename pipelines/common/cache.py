@@ -0,0 +1,53 @@
+import hashlib
+import logging
+import os
+import pandas as pd
+
+from typing import Any, Callable, Optional
+
+# Create logger
+log = logging.getLogger(__name__)
+
+
+def frame_digest(*frames: pd.DataFrame) -> str:
+	'''Returns a hex sha256 digest of the columns and content of dataframes'''
+	digest = hashlib.sha256()
+	for frame in frames:
+		digest.update(repr(list(frame.columns)).encode())
+		digest.update(pd.util.hash_pandas_object(frame, index=False).values.tobytes())
+
+	return digest.hexdigest()
+
+
+def load_cached(cache_folder_path: Optional[str], name: str, key: str, build: Callable[[], Any]) -> Any:
+	'''Returns the object cached under name if it was built for the same key, else builds and caches it.
+
+	The key, typically a digest of the inputs, is stored next to the pickled object.
+	Without a cache folder the object is simply built.
+	'''
+	if cache_folder_path is None:
+		return build()
+
+	os.makedirs(cache_folder_path, exist_ok=True)
+	object_path = os.path.join(cache_folder_path, name + '.pkl')
+	key_path = os.path.join(cache_folder_path, name + '.key')
+
+	if os.path.exists(object_path) and os.path.exists(key_path):
+		with open(key_path) as f:
+			if f.read() == key:
+				log.info('Loading cached %s', name)
+				return pd.read_pickle(object_path)
+
+	log.info('Building %s', name)
+	obj = build()
+
+	# Drop the old key first and write the new one last, so an interrupted run never pairs
+	# a key with an object built for another one
+	if os.path.exists(key_path):
+		os.remove(key_path)
+	pd.to_pickle(obj, object_path)
+	with open(key_path + '.tmp', 'w') as f:
+		f.write(key)
+	os.replace(key_path + '.tmp', key_path)
+
+	return obj
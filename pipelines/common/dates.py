@@ -0,0 +1,160 @@
+import numpy as np
+import pandas as pd
+
+from typing import Tuple, Union
+
+DatetimeLike = Union[pd.Series, pd.DatetimeIndex, np.ndarray]
+
+
+def _civil_from_days(days: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+	'''Returns year, month and day arrays from days since 1970-01-01 (proleptic Gregorian)'''
+	z = days + 719468
+	era = z // 146097
+	doe = z - era * 146097
+	yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+	doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+	mp = (5 * doy + 2) // 153
+	day = doy - (153 * mp + 2) // 5 + 1
+	month = np.where(mp < 10, mp + 3, mp - 9)
+	year = yoe + era * 400 + (month <= 2)
+
+	return year, month, day
+
+
+def _days_from_civil(year: np.ndarray, month: np.ndarray, day: np.ndarray) -> np.ndarray:
+	'''Returns days since 1970-01-01 from year, month and day arrays (proleptic Gregorian)'''
+	year = year - (month <= 2)
+	era = year // 400
+	yoe = year - era * 400
+	doy = (153 * np.where(month > 2, month - 3, month + 9) + 2) // 5 + day - 1
+	doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+
+	return era * 146097 + doe - 719468
+
+
+def _shift_days(days: np.ndarray, years: int) -> np.ndarray:
+	year, month, day = _civil_from_days(days)
+
+	# Clip Feb 29 when the target year is not a leap year
+	target_year = year + years
+	leap = (target_year % 4 == 0) & ((target_year % 100 != 0) | (target_year % 400 == 0))
+	day = np.where((month == 2) & (day == 29) & ~leap, 28, day)
+
+	return _days_from_civil(target_year, month, day)
+
+
+def shift_years(values: DatetimeLike, years: int) -> DatetimeLike:
+	'''Shifts datetimes by a number of years, like adding pd.DateOffset(years=years).
+
+	Works on the datetime64 integer representations rather than per element. Feb 29
+	is moved to Feb 28 when the target year is not a leap year, and NaT stays NaT.
+	Series keep their index.
+	'''
+	if isinstance(values, pd.Series):
+		return pd.Series(shift_years(values.values, years), index=values.index, name=values.name)
+	if isinstance(values, pd.DatetimeIndex):
+		return pd.DatetimeIndex(shift_years(values.values, years), name=values.name)
+
+	values = np.asarray(values)
+	if not np.issubdtype(values.dtype, np.datetime64):
+		values = pd.to_datetime(values).values
+
+	dates = values.astype('datetime64[D]')
+	days = dates.view(np.int64)
+	nat = np.isnat(values)
+	if nat.all():
+		return values.copy()
+
+	# Dates usually span a few years only, so shift every day of the span once and look the
+	# rows up in that table, rather than running the calendar arithmetic on every row
+	first, last = days[~nat].min(), days[~nat].max()
+	if last - first < max(len(days), 1 << 16):
+		table = _shift_days(np.arange(first, last + 1), years)
+		shifted = table[np.where(nat, first, days) - first]
+	else:
+		shifted = _shift_days(days, years)
+
+	# Keep the time of day and the original resolution
+	result = (shifted.view('datetime64[D]') + (values - dates)).astype(values.dtype)
+	result[nat] = np.datetime64('NaT')
+
+	return result
+
+
+def _decode_yyyymmdd(values: Union[pd.Series, np.ndarray]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+	'''Returns the factorized codes (-1 for NaN) and the year, month, day and days since 1970-01-01
+	of every distinct YYYYMMDD number, raising a ValueError on invalid dates'''
+	codes, uniques = pd.factorize(np.asarray(values))
+	numbers = np.asarray(uniques).astype(np.int64)
+
+	year, month, day = numbers // 10000, numbers // 100 % 100, numbers % 100
+	days = _days_from_civil(year, np.clip(month, 1, 12), day)
+	invalid = (month < 1) | (month > 12) | (day < 1) | (_civil_from_days(days)[2] != day)
+	if invalid.any():
+		raise ValueError('Invalid YYYYMMDD dates: %s' % ', '.join(str(value) for value in numbers[invalid][:5]))
+
+	return codes, year, month, day, days
+
+
+def decode_yyyymmdd(values: Union[pd.Series, np.ndarray]) -> np.ndarray:
+	'''Decodes YYYYMMDD numbers (e.g. 20200131) into datetime64 values with integer arithmetic.
+
+	Every distinct value is decoded once; NaN becomes NaT and invalid dates raise a
+	ValueError.
+	'''
+	codes, _, _, _, days = _decode_yyyymmdd(values)
+
+	return np.append(days.view('datetime64[D]'), np.datetime64('NaT')).astype('datetime64[ns]')[codes]
+
+
+# Months are keyed internally by year * 12 + month - 1, as int32
+MISSING_MONTH = -1
+
+
+def yyyymmdd_month_keys(values: Union[pd.Series, np.ndarray]) -> np.ndarray:
+	'''Returns the month keys of YYYYMMDD numbers, MISSING_MONTH for NaN'''
+	codes, year, month, _, _ = _decode_yyyymmdd(values)
+
+	return np.append(year * 12 + month - 1, MISSING_MONTH).astype(np.int32)[codes]
+
+
+def month_keys(values: Union[pd.Series, np.ndarray]) -> np.ndarray:
+	'''Returns the int32 month keys (year * 12 + month - 1) of datetimes or date strings.
+
+	Keys group, join and sort like the months they stand for and shift by a year by
+	adding 12. Every distinct value is parsed once; missing values get MISSING_MONTH.
+	'''
+	codes, uniques = pd.factorize(np.asarray(values))
+	months = pd.to_datetime(np.asarray(uniques)).values.astype('datetime64[M]').astype(np.int64) + 1970 * 12
+
+	return np.append(months, MISSING_MONTH).astype(np.int32)[codes]
+
+
+def month_starts(keys: Union[pd.Series, np.ndarray]) -> np.ndarray:
+	'''Returns the first day of the month of month keys, as datetime64 (NaT for MISSING_MONTH)'''
+	keys = np.asarray(keys, dtype=np.int64)
+	missing = keys == MISSING_MONTH
+	starts = np.where(missing, 0, keys - 1970 * 12).astype('datetime64[M]').astype('datetime64[ns]')
+	starts[missing] = np.datetime64('NaT')
+
+	return starts
+
+
+def shift_month_keys(keys: Union[pd.Series, np.ndarray], months: int) -> np.ndarray:
+	'''Shifts month keys by a number of months, leaving MISSING_MONTH as is'''
+	keys = np.asarray(keys)
+
+	return np.where(keys == MISSING_MONTH, keys, keys + months).astype(np.int32)
+
+
+def format_month_keys(keys: Union[pd.Series, np.ndarray], date_format: str='%b %Y') -> pd.Categorical:
+	'''Formats month keys as strings (by default 'Jan 2020'), formatting every distinct month once'''
+	codes, uniques = pd.factorize(np.asarray(keys), sort=True)
+	uniques = np.asarray(uniques)
+	formatted = pd.DatetimeIndex(month_starts(uniques)).strftime(date_format)
+
+	valid = uniques != MISSING_MONTH
+	categories = pd.Index(formatted[valid]).unique()
+	lookup = np.append(np.where(valid, categories.get_indexer(formatted), -1), -1)
+
+	return pd.Categorical.from_codes(lookup[codes], categories=categories)
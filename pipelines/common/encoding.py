@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+from typing import List, Tuple
+
+
+def joint_codes(left: pd.Series, right: pd.Series) -> Tuple[np.ndarray, np.ndarray, int]:
+	'''Returns integer codes of two columns over a shared set of values (-1 for nulls)'''
+	# Categorical codes line up only when the categories are in the same order, which
+	# dtype equality does not check for unordered categoricals
+	if isinstance(left.dtype, pd.CategoricalDtype) and isinstance(right.dtype, pd.CategoricalDtype) \
+		and left.cat.categories.equals(right.cat.categories):
+		return left.cat.codes.values, right.cat.codes.values, len(left.cat.categories)
+
+	# Factorize each column, then remap both onto the union of their values
+	left_codes, left_uniques = pd.factorize(left)
+	right_codes, right_uniques = pd.factorize(right)
+	uniques = pd.Index(left_uniques).append(pd.Index(right_uniques)).unique()
+
+	left_codes = np.append(uniques.get_indexer(left_uniques), -1)[left_codes]
+	right_codes = np.append(uniques.get_indexer(right_uniques), -1)[right_codes]
+	return left_codes, right_codes, len(uniques)
+
+
+def encode_keys(left: pd.DataFrame, right: pd.DataFrame, keys: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+	'''Encodes the multi-column keys of two frames into int64 codes, equal exactly when the keys are.
+
+	Every column is coded over the values of both frames, nulls matching nulls like in
+	pd.merge, and the column codes are combined into one integer. The combined codes are
+	factorized again whenever the next column could overflow them.
+	'''
+	left_key = np.zeros(len(left), dtype=np.int64)
+	right_key = np.zeros(len(right), dtype=np.int64)
+	size = 1
+	for col in keys:
+		left_codes, right_codes, n = joint_codes(left[col], right[col])
+
+		# Nulls get a code of their own
+		left_codes = np.where(left_codes < 0, n, left_codes)
+		right_codes = np.where(right_codes < 0, n, right_codes)
+		n += 1
+
+		if size * n >= 2**62:
+			codes, uniques = pd.factorize(np.concatenate([left_key, right_key]))
+			left_key, right_key, size = codes[:len(left)].astype(np.int64), codes[len(left):].astype(np.int64), len(uniques)
+
+		left_key = left_key * n + left_codes
+		right_key = right_key * n + right_codes
+		size *= n
+
+	return left_key, right_key
+
+
+def align_frames(frames: List[pd.DataFrame], keys: List[str]) -> Tuple[pd.DataFrame, List[np.ndarray]]:
+	'''Returns the distinct keys of frames in sorted order and, for every frame, its row holding each key (-1 for none).
+
+	Null keys are kept and match each other, like in an outer pd.merge. Keys are
+	assumed to be unique within a frame; the last row wins otherwise.
+	'''
+	stacked = pd.concat([frame[keys] for frame in frames], ignore_index=True, sort=False)
+	ids = stacked.groupby(keys, sort=True, dropna=False).ngroup().values
+	_, first = np.unique(ids, return_index=True)
+	distinct = stacked.iloc[first].reset_index(drop=True)
+
+	rows = []
+	start = 0
+	for frame in frames:
+		frame_rows = np.full(len(distinct), -1, dtype=np.int64)
+		frame_rows[ids[start:start + len(frame)]] = np.arange(len(frame))
+		rows.append(frame_rows)
+		start += len(frame)
+
+	return distinct, rows
+
+
+def lookup_rows(data: pd.DataFrame, data_keys: List[str], table: pd.DataFrame, table_keys: List[str]) -> np.ndarray:
+	'''Returns the row of table whose table_keys equal the data_keys of every row of data, -1 for none.
+
+	Keys are encoded to integers and looked up by binary search over the sorted table
+	keys; nulls match nulls like in pd.merge.
+	'''
+	data_key, table_key = encode_keys(
+		data[data_keys].rename(columns=dict(zip(data_keys, table_keys))), table[table_keys], table_keys)
+	if not len(table_key):
+		return np.full(len(data), -1, dtype=np.int64)
+
+	order = np.argsort(table_key, kind='stable')
+	table_key = table_key[order]
+
+	position = np.searchsorted(table_key, data_key)
+	found = position < len(table_key)
+	found[found] = table_key[position[found]] == data_key[found]
+
+	return np.where(found, order[np.minimum(position, len(order) - 1)], -1)
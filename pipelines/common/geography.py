@@ -0,0 +1,187 @@
+import logging
+import numpy as np
+import pandas as pd
+
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from .encoding import joint_codes
+
+# Create logger
+log = logging.getLogger(__name__)
+
+TRAVEL_TYPES = ['Domestic', 'Continental', 'Intercontinental']
+
+
+class CountryDimension:
+	'''Country attributes stored once and referenced from fact tables by int16 codes.
+
+	Codes are row positions in the country mappings table, so every pipeline building
+	the dimension from the same mappings gets the same codes. Attributes are handed
+	out as categoricals sharing one set of categories; call ``materialize`` at the
+	output boundary to turn them back into plain strings.
+	'''
+
+	def __init__(
+		self,
+		country_mappings: pd.DataFrame,
+		key: str='code_2',
+		extra_keys: Optional[Iterable[str]]=None):
+
+		table = country_mappings[~pd.isnull(country_mappings[key])].drop_duplicates(key)
+
+		# Keys known elsewhere (e.g. country name mappings) but missing from the mappings
+		if extra_keys is not None:
+			extra = pd.Index(pd.Series(list(extra_keys)).dropna().unique()).difference(pd.Index(table[key]))
+			table = pd.concat([table, pd.DataFrame({key: extra})], ignore_index=True, sort=False)
+
+		self.key = key
+		self.table = table.reset_index(drop=True)
+		self.index = pd.Index(self.table[key])
+		self._categories = {}
+
+	def encode(self, values: Iterable, aliases: Optional[pd.Series]=None) -> np.ndarray:
+		'''Returns the int16 code of every value, -1 when unmapped.
+
+		With ``aliases`` (a series of keys indexed by alias, e.g. country names) the
+		values are looked up as aliases.
+		'''
+		if aliases is None:
+			return self.index.get_indexer(values).astype(np.int16)
+
+		aliases = aliases[~aliases.index.duplicated()]
+		alias_codes = np.append(self.index.get_indexer(aliases.values), -1).astype(np.int16)
+		return alias_codes[pd.Index(aliases.index).get_indexer(values)]
+
+	def attribute(self, codes: np.ndarray, column: str) -> pd.Categorical:
+		'''Returns an attribute for every code, as a categorical (NaN for code -1)'''
+		if column not in self._categories:
+			values = self.table[column]
+			categories = pd.Index(values.dropna().unique())
+			self._categories[column] = (categories, np.append(categories.get_indexer(values), -1))
+
+		categories, lookup = self._categories[column]
+		return pd.Categorical.from_codes(lookup[codes], categories=categories)
+
+	def add_attributes(
+		self,
+		data: pd.DataFrame,
+		column: str,
+		attributes: Union[List[str], Dict[str, str]],
+		suffix: str='',
+		aliases: Optional[pd.Series]=None) -> np.ndarray:
+		'''Adds attribute columns for the values of ``column`` to data, in place.
+
+		``attributes`` lists the dimension columns to add, or maps them to output
+		column names; ``suffix`` is appended to every output name. Values that cannot
+		be mapped are logged. Returns the codes.
+		'''
+		if not isinstance(attributes, dict):
+			attributes = {attribute: attribute for attribute in attributes}
+
+		values = data[column]
+		codes = self.encode(values, aliases)
+
+		# Report unmapped values
+		unmapped = (codes == -1) & ~pd.isnull(values).values
+		if unmapped.any():
+			unmapped_values = pd.Series(values.values[unmapped]).value_counts()
+			log.warning(
+				'%d rows of %s could not be mapped to a country: %s',
+				unmapped.sum(), column, ', '.join('%s (%d)' % item for item in unmapped_values.items()))
+
+		for attribute, name in attributes.items():
+			data[name + suffix] = self.attribute(codes, attribute)
+
+		return codes
+
+
+def classify_travel_type(
+	country_origin: pd.Series,
+	country_destination: pd.Series,
+	region_origin: pd.Series,
+	region_destination: pd.Series) -> pd.Categorical:
+	'''Classifies rows as Domestic (same country), Continental (same region) or Intercontinental.
+
+	Countries and regions are turned into integer codes (free for categoricals from a
+	CountryDimension), a country pair -> travel type matrix is built once over the few
+	hundred countries, and rows are classified by indexing it. Regions are assumed to
+	be a function of the country, as they are when both come from country mappings.
+	'''
+	country_origin_codes, country_destination_codes, n_countries = joint_codes(country_origin, country_destination)
+	region_origin_codes, region_destination_codes, _ = joint_codes(region_origin, region_destination)
+
+	# Region of every country, the extra last slot stands for null countries (code -1)
+	country_regions = np.full(n_countries + 1, -1, dtype=np.int64)
+	country_regions[country_origin_codes] = region_origin_codes
+	country_regions[country_destination_codes] = region_destination_codes
+	country_regions[-1] = -1
+
+	# Country pair -> travel type matrix
+	same_country = np.eye(n_countries + 1, dtype=bool)
+	same_country[-1, -1] = False
+	same_region = (country_regions[:, None] == country_regions[None, :]) & (country_regions[:, None] >= 0)
+	matrix = np.where(same_country, 0, np.where(same_region, 1, 2)).astype(np.int8)
+
+	return pd.Categorical.from_codes(matrix[country_origin_codes, country_destination_codes], categories=TRAVEL_TYPES)
+
+
+def materialize(data: pd.DataFrame) -> pd.DataFrame:
+	'''Converts categorical columns back to plain columns of their categories' dtype'''
+	for col in data.columns:
+		if isinstance(data[col].dtype, pd.CategoricalDtype):
+			data[col] = data[col].astype(data[col].cat.categories.dtype)
+
+	return data
+
+
+class Markets:
+	'''Half-alpha markets (the two countries of a route in alphabetical order, e.g. 'DE-FR') as integer ids.
+
+	Country codes are factorized in sorted order, so the first country of a market is the
+	one with the lower code and a market id is first * n_countries + second (-1 when a
+	code is null). Country attributes go into per-country lookup tables and market names
+	are only built for the distinct markets.
+	'''
+
+	def __init__(self, country_code_origin: pd.Series, country_code_destination: pd.Series):
+		codes, countries = pd.factorize(
+			np.concatenate([np.asarray(country_code_origin, dtype=object), np.asarray(country_code_destination, dtype=object)]),
+			sort=True)
+		self.countries = pd.Index(countries)
+		self._origin_codes = codes[:len(country_code_origin)]
+		self._destination_codes = codes[len(country_code_origin):]
+
+		first = np.minimum(self._origin_codes, self._destination_codes)
+		second = np.maximum(self._origin_codes, self._destination_codes)
+		self.ids = np.where(first < 0, -1, first * len(self.countries) + second)
+
+	def split(self, ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+		'''Returns the codes of the first and second country of market ids'''
+		ids = np.asarray(ids)
+		return ids // len(self.countries), ids % len(self.countries)
+
+	def lookup(self, origin_values: pd.Series, destination_values: pd.Series) -> np.ndarray:
+		'''Returns a table of a country attribute by country code, from its origin and destination columns.
+
+		The attribute is assumed to be a function of the country, as it is for attributes
+		from a CountryDimension.
+		'''
+		table = np.full(len(self.countries), np.nan, dtype=object)
+		for codes, values in ((self._origin_codes, origin_values), (self._destination_codes, destination_values)):
+			# Read the attribute from one row per country
+			country_codes, rows = np.unique(codes, return_index=True)
+			known = country_codes >= 0
+			table[country_codes[known]] = np.asarray(pd.Series(values).iloc[rows[known]], dtype=object)
+
+		return table
+
+	def names(self, ids: np.ndarray, table: Optional[np.ndarray]=None, separator: str='-') -> np.ndarray:
+		'''Returns the names of market ids, from country codes or from a lookup table of country values'''
+		uniques, inverse = np.unique(np.asarray(ids), return_inverse=True)
+		first, second = self.split(uniques)
+		values = self.countries.values.astype(object) if table is None else table
+
+		names = pd.Series(values[first]) + separator + pd.Series(values[second])
+		names[uniques < 0] = np.nan
+
+		return names.values[inverse.ravel()]
@@ -0,0 +1,208 @@
+import hashlib
+import itertools
+import json
+import logging
+import os
+import pandas as pd
+import shutil
+
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from .parallel import imap_files
+
+# Create logger
+log = logging.getLogger(__name__)
+
+MANIFEST_FILE = 'manifest.json'
+KEY_FILE = 'key'
+STATE_NAME = 'state'
+PARTIALS_FOLDER = 'partials'
+
+# File extension, writer and reader of every partial and state format
+FORMATS = {
+	'pickle': ('.pkl', lambda obj, path: pd.to_pickle(obj, path), pd.read_pickle),
+	'parquet': ('.parquet', lambda obj, path: obj.to_parquet(path), pd.read_parquet),
+}
+
+
+def file_sha256(file_path: str, block_size: int=1 << 20) -> str:
+	'''Returns the hex sha256 digest of a file, read in blocks'''
+	digest = hashlib.sha256()
+	with open(file_path, 'rb') as f:
+		for block in iter(lambda: f.read(block_size), b''):
+			digest.update(block)
+
+	return digest.hexdigest()
+
+
+def fingerprint_file(file_path: str, previous: Optional[Dict[str, Any]]=None) -> Dict[str, Any]:
+	'''Returns the name, size, mtime and content hash of a file.
+
+	The content hash of ``previous`` is reused when size and mtime are unchanged,
+	so unchanged files are never read.
+	'''
+	stat = os.stat(file_path)
+	fingerprint = {
+		'name': os.path.basename(file_path),
+		'size': stat.st_size,
+		'mtime': stat.st_mtime,
+	}
+
+	if previous is not None and previous['size'] == fingerprint['size'] and previous['mtime'] == fingerprint['mtime']:
+		fingerprint['sha256'] = previous['sha256']
+	else:
+		fingerprint['sha256'] = file_sha256(file_path)
+
+	return fingerprint
+
+
+def load_manifest(state_folder_path: str) -> Dict[str, Dict[str, Any]]:
+	manifest_path = os.path.join(state_folder_path, MANIFEST_FILE)
+	if not os.path.exists(manifest_path):
+		return {}
+
+	with open(manifest_path) as f:
+		return json.load(f)
+
+
+def save_manifest(state_folder_path: str, manifest: Dict[str, Dict[str, Any]]):
+	# Write to a temporary file first so an interrupted run never leaves a truncated manifest
+	manifest_path = os.path.join(state_folder_path, MANIFEST_FILE)
+	with open(manifest_path + '.tmp', 'w') as f:
+		json.dump(manifest, f, indent=2, sort_keys=True)
+	os.replace(manifest_path + '.tmp', manifest_path)
+
+
+def load_key(state_folder_path: str) -> Optional[str]:
+	key_path = os.path.join(state_folder_path, KEY_FILE)
+	if not os.path.exists(key_path):
+		return None
+
+	with open(key_path) as f:
+		return f.read()
+
+
+def save_key(state_folder_path: str, key: str):
+	key_path = os.path.join(state_folder_path, KEY_FILE)
+	with open(key_path + '.tmp', 'w') as f:
+		f.write(key)
+	os.replace(key_path + '.tmp', key_path)
+
+
+def load_incremental(
+	file_paths: List[str],
+	process_file: Callable[[str], Any],
+	reduce: Callable[[Iterable[Any]], Any],
+	state_folder_path: str,
+	workers: Optional[int]=1,
+	key: Optional[str]=None,
+	process_files: Optional[Callable[[List[str]], Iterable[Any]]]=None,
+	partial_format: str='pickle',
+	version: Optional[str]=None) -> Optional[Any]:
+	'''Processes only new or changed files and folds them into a persisted state.
+
+	Every processed file keeps its partial result next to the manifest. New files
+	are folded into the persisted state directly; when a known file changed or
+	disappeared the state is rebuilt from the stored partials, without re-reading
+	any of the unchanged files. Partials and state can be any picklable object,
+	typically a dataframe or a tuple of dataframes, or dataframes stored as parquet
+	with ``partial_format='parquet'``. Returns None when there are no files.
+
+	Partials are written, and recorded in the manifest, as soon as they are processed
+	and are fed to the reduce one at a time, so no more than one is held in memory and
+	an interrupted run keeps the files it got through.
+
+	``key`` identifies everything else the partials depend on (e.g. a digest of
+	reference data); when it differs from the stored one every file is processed
+	again, as it is when ``version``, the layout version of the partials, changes.
+	``process_files`` can replace mapping process_file over the files, e.g.
+	to split them across workers itself; it must yield one partial per file in order.
+	'''
+	extension, write, read = FORMATS[partial_format]
+	partials_folder_path = os.path.join(state_folder_path, PARTIALS_FOLDER)
+	state_path = os.path.join(state_folder_path, STATE_NAME + extension)
+
+	manifest = load_manifest(state_folder_path)
+	if version is not None:
+		key = '%s:%s' % (version, '' if key is None else key)
+
+	# Partials built for another key cannot be reused
+	if key is not None and load_key(state_folder_path) != key:
+		if manifest:
+			log.info('Inputs changed since the last run, processing every file again')
+		manifest = {}
+		shutil.rmtree(partials_folder_path, ignore_errors=True)
+		if os.path.exists(state_path):
+			os.remove(state_path)
+		os.makedirs(state_folder_path, exist_ok=True)
+		save_manifest(state_folder_path, manifest)
+		save_key(state_folder_path, key)
+	os.makedirs(partials_folder_path, exist_ok=True)
+
+	# Compare the folder content against the manifest
+	fingerprints = {}
+	for file_path in file_paths:
+		name = os.path.basename(file_path)
+		fingerprints[name] = fingerprint_file(file_path, manifest.get(name))
+
+	def _partial_path(name):
+		return os.path.join(partials_folder_path, name + extension)
+
+	new = [name for name in fingerprints if name not in manifest]
+	changed = [name for name in fingerprints if name in manifest
+		and (fingerprints[name]['sha256'] != manifest[name]['sha256'] or not os.path.exists(_partial_path(name)))]
+	removed = [name for name in manifest if name not in fingerprints]
+	log.info('%d new, %d changed and %d removed files since the last run', len(new), len(changed), len(removed))
+
+	# Forget removed and changed files before touching their partials, and refresh the
+	# fingerprints of unchanged files
+	manifest = {name: fingerprints[name] for name in manifest if name in fingerprints and name not in changed}
+	save_manifest(state_folder_path, manifest)
+	for name in removed:
+		if os.path.exists(_partial_path(name)):
+			os.remove(_partial_path(name))
+
+	# Unchanged state, or no files at all
+	if not (new or changed or removed) and os.path.exists(state_path):
+		return read(state_path)
+	if not fingerprints:
+		if os.path.exists(state_path):
+			os.remove(state_path)
+		return None
+
+	# The persisted state only stays valid when new files are folded into it, and it is
+	# dropped before processing so that an interrupted run rebuilds it from the partials
+	previous_state = None
+	if os.path.exists(state_path):
+		if not (changed or removed):
+			previous_state = read(state_path)
+		os.remove(state_path)
+
+	# Process new and changed files only, in name order
+	paths_by_name = {os.path.basename(file_path): file_path for file_path in file_paths}
+	to_process = sorted(new + changed)
+	to_process_paths = [paths_by_name[name] for name in to_process]
+	if process_files is None:
+		results = imap_files(process_file, to_process_paths, workers)
+	else:
+		results = iter(process_files(to_process_paths) if to_process else [])
+
+	def _processed(name):
+		# Write every partial and its manifest entry as soon as it arrives
+		partial = next(results)
+		write(partial, _partial_path(name))
+		manifest[name] = fingerprints[name]
+		save_manifest(state_folder_path, manifest)
+		return partial
+
+	# Fold into the persisted state, stored partials being read one at a time as the reduce consumes them
+	if previous_state is not None:
+		state = reduce(itertools.chain([previous_state], (_processed(name) for name in to_process)))
+	else:
+		processing = set(to_process)
+		state = reduce(
+			_processed(name) if name in processing else read(_partial_path(name))
+			for name in sorted(fingerprints))
+	write(state, state_path)
+
+	return state
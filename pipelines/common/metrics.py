@@ -0,0 +1,22 @@
+import json
+import logging
+import os
+
+from typing import Any, Dict, List, Optional
+
+# Create logger
+log = logging.getLogger(__name__)
+
+
+def emit(name: str, records: List[Dict[str, Any]], file_path: Optional[str]=None):
+	'''Logs metrics records as JSON, and appends them to a JSON lines file when file_path is set'''
+	for record in records:
+		log.info('%s metrics %s', name, json.dumps(record, sort_keys=True))
+
+	if file_path and records:
+		folder_path = os.path.dirname(file_path)
+		if folder_path:
+			os.makedirs(folder_path, exist_ok=True)
+		with open(file_path, 'a') as f:
+			for record in records:
+				f.write(json.dumps(dict(record, metrics=name), sort_keys=True) + '\n')
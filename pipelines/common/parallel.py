@@ -0,0 +1,95 @@
+import io
+import logging
+import os
+import pandas as pd
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+# Create logger
+log = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+def imap_files(func: Callable[[str], T], file_paths: List[str], workers: Optional[int]=1) -> Iterator[T]:
+	'''Like map_files, but yields the results one at a time so they can be reduced as they arrive'''
+	if not workers or workers <= 1 or len(file_paths) <= 1:
+		for file_path in file_paths:
+			yield func(file_path)
+		return
+
+	workers = min(workers, len(file_paths))
+	log.info('Processing %d files across %d worker processes', len(file_paths), workers)
+	with ProcessPoolExecutor(max_workers=workers) as executor:
+		for result in executor.map(func, file_paths):
+			yield result
+
+
+def map_files(func: Callable[[str], T], file_paths: List[str], workers: Optional[int]=1) -> List[T]:
+	'''Applies func to every file path, across a pool of worker processes when workers > 1.
+
+	func must be a module level function so it can be sent to the workers. Results
+	are returned in the order of file_paths.
+	'''
+	return list(imap_files(func, file_paths, workers))
+
+
+def split_file(file_path: str, parts: int) -> List[Tuple[int, int]]:
+	'''Splits a text file with a header line into up to ``parts`` byte ranges of whole lines.
+
+	Ranges exclude the header and are returned as (start, end) offsets, to be read
+	with read_csv_range.
+	'''
+	size = os.path.getsize(file_path)
+	with open(file_path, 'rb') as f:
+		f.readline()
+		offsets = [f.tell()]
+
+		# Move every boundary to the start of the next line
+		step = (size - offsets[0]) / max(parts, 1)
+		for k in range(1, max(parts, 1)):
+			f.seek(offsets[0] + int(k * step))
+			f.readline()
+			offsets.append(min(f.tell(), size))
+	offsets.append(size)
+
+	boundaries = sorted(set(offsets))
+	return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+class _RangeReader(io.RawIOBase):
+	'''Reads the header line of a file followed by the bytes from start to end, without loading them'''
+
+	def __init__(self, file_path: str, start: int, end: int):
+		self._file = open(file_path, 'rb')
+		self._header = self._file.readline()
+		self._file.seek(start)
+		self._remaining = max(end - start, 0)
+
+	def readable(self) -> bool:
+		return True
+
+	def readinto(self, buffer) -> int:
+		if self._header:
+			n = min(len(buffer), len(self._header))
+			buffer[:n] = self._header[:n]
+			self._header = self._header[n:]
+			return n
+
+		n = self._file.readinto(memoryview(buffer)[:min(len(buffer), self._remaining)]) if self._remaining else 0
+		self._remaining -= n
+		return n
+
+	def close(self):
+		if not self.closed:
+			self._file.close()
+		super().close()
+
+
+def read_csv_range(file_path: str, start: int, end: int, **kwargs) -> Iterable:
+	'''Reads the lines in a byte range of a csv file with pd.read_csv, using the file's header.
+
+	The range is streamed, so with a chunksize only about a chunk of it is held in memory.
+	'''
+	return pd.read_csv(io.BufferedReader(_RangeReader(file_path, start, end)), **kwargs)
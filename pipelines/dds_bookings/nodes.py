@@ -1,202 +1,291 @@
+import datetime as dt
+import itertools
 import logging
 import numpy as np
 import os
 import pandas as pd
 
-from typing import Any, Dict
+from functools import partial
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from ..common import aggregation, baseline, benchmarks, dates, geography, incremental, parallel
+
+try:
+	import pyarrow as pa
+	import pyarrow.compute as pc
+	from pyarrow import csv as pa_csv
+except ImportError:
+	pa_csv = None
 
 # Create logger
 log = logging.getLogger(__name__)
 
+# Delta file columns used downstream
+DELTA_DATE_COLUMNS = ['Purchase Date', 'Travel Date']
+DELTA_COUNTRY_COLUMNS = ['Country of Sale', 'Orig Country', 'Dest Country']
+DELTA_COLUMNS = DELTA_DATE_COLUMNS + DELTA_COUNTRY_COLUMNS + ['Pax']
+
+# Aggregation keys of the purchase date and travel date views
+PURCHASE_DATE_KEYS = ['Purchase Date'] + DELTA_COUNTRY_COLUMNS + ['Travel Month']
+TRAVEL_DATE_KEYS = ['Travel Date'] + DELTA_COUNTRY_COLUMNS
+
+# Bump whenever the layout of the cached delta aggregates changes
+PARTIALS_VERSION = '2'
+
+
+def _list_delta_files(deltas_folder_paths: str) -> List[str]:
+	return [deltas_folder_paths + '/' + filename for filename in sorted(os.listdir(deltas_folder_paths))
+		if filename.startswith('Tickets_purchased')]
+
+
+def _read_delta_file(file_path: str) -> pd.DataFrame:
+	# Resolve the file's own column names (underscores instead of spaces) from the header
+	with open(file_path) as f:
+		header = f.readline().rstrip('\r\n').split('\t')
+	source_columns = {col.replace('_', ' '): col for col in header}
+	usecols = [source_columns[col] for col in DELTA_COLUMNS]
+
+	if pa_csv is not None:
+		# Only read the used columns, with dates parsed and countries dictionary encoded by pyarrow
+		column_types = {source_columns[col]: pa.date32() for col in DELTA_DATE_COLUMNS}
+		column_types.update({source_columns[col]: pa.dictionary(pa.int32(), pa.string()) for col in DELTA_COUNTRY_COLUMNS})
+		table = pa_csv.read_csv(
+			file_path,
+			parse_options=pa_csv.ParseOptions(delimiter='\t'),
+			convert_options=pa_csv.ConvertOptions(include_columns=usecols, column_types=column_types))
 
-def load_data(
-	historical_data: pd.DataFrame,
-	deltas_folder_paths: str,
-	date_field: str) -> pd.DataFrame:
-
-	# Load and aggregate delta files
-	deltas = []
-	#Initialize temp dataframe
-	temp = None
-	for filename in os.listdir(deltas_folder_paths):
-		if not filename.startswith('Tickets_purchased'):
-			continue
-
-		if temp is not None:
-			del temp
-
-		file_path = deltas_folder_paths + '/' + filename
-		print(filename)
-		# read the tab separated individual file
-		temp = pd.read_csv(file_path, sep='\t')
-		# Correct column names
-		temp.columns = [col.replace('_', ' ') for col in temp.columns]
 		# Filter out any weird travel dates values (NULL, default value etc)
-		temp = temp[(temp['Travel Date'] < '2100-01-01') & (~pd.isnull(temp['Travel Date']))]
-		# Filter in only travel dates which are within 1 year of purchase
-		temp = temp[(pd.to_datetime(temp['Travel Date']) >= pd.to_datetime(temp['Purchase Date']))
-			& (pd.to_datetime(temp['Travel Date']) <= (pd.to_datetime(temp['Purchase Date']) + pd.offsets.DateOffset(years=1)))]
-		# Create the column for Travel month from travel dates
-		temp['Travel Month'] = pd.to_datetime(temp['Travel Date']).dt.strftime('%b %Y')
-		# Aggregate (sum of pass) on Purchase Date, Travel Month, POS country, Country Origin,
-		# Country destination
-		aggregated = temp \
-			.groupby(['Purchase Date', 'Country of Sale', 'Orig Country', 'Dest Country', 'Travel Month']) \
-			.agg({'Pax': np.sum}) \
-			.reset_index()
-		# Append to the empty list of deltas
-		deltas.append(aggregated)
-	
-	# Concatenate, aggregate and return results
-	data = pd.concat([historical_data] + deltas, sort=False) \
-			.groupby(['Purchase Date', 'Country of Sale', 'Orig Country', 'Dest Country', 'Travel Month']) \
-			.agg({'Pax': np.sum}) \
-			.reset_index()
-	del historical_data
+		table = table.filter(pc.less(table.column(source_columns['Travel Date']), pa.scalar(dt.date(2100, 1, 1))))
+		temp = table.to_pandas(date_as_object=False)
+	else:
+		temp = pd.read_csv(
+			file_path,
+			sep='\t',
+			usecols=usecols,
+			dtype={source_columns[col]: 'category' for col in DELTA_COUNTRY_COLUMNS})
 
-	# Concatenate and return data
-	return data
+		# Filter out any weird travel dates values (NULL, default value etc)
+		temp = temp[(temp[source_columns['Travel Date']] < '2100-01-01') & (~pd.isnull(temp[source_columns['Travel Date']]))]
+		for col in DELTA_DATE_COLUMNS:
+			temp[source_columns[col]] = pd.to_datetime(temp[source_columns[col]])
+
+	# Correct column names
+	temp.columns = [col.replace('_', ' ') for col in temp.columns]
+
+	return temp
+
+
+def _aggregate_delta_file(file_path: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
+	log.info('Aggregating delta file %s', os.path.basename(file_path))
+	temp = _read_delta_file(file_path)
+
+	# Filter in only travel dates which are within 1 year of purchase
+	temp = temp[(temp['Travel Date'] >= temp['Purchase Date'])
+		& (temp['Travel Date'] <= dates.shift_years(temp['Purchase Date'], 1))]
+	# Create the column for Travel month from travel dates, as int month keys
+	temp['Travel Month'] = dates.month_keys(temp['Travel Date'])
+
+	# Aggregate (sum of pass) by Purchase Date and Travel Month, and by Travel Date, on POS country,
+	# Country Origin, Country destination
+	by_purchase_date = _aggregate_purchase_date(temp)
+	by_travel_date = _aggregate_travel_date(temp)
 
+	# Format the date keys like the historical data, on the aggregated rows only
+	by_purchase_date['Purchase Date'] = by_purchase_date['Purchase Date'].dt.strftime('%Y-%m-%d')
+	by_travel_date['Travel Date'] = by_travel_date['Travel Date'].dt.strftime('%Y-%m-%d')
 
-def load_travel_date_data(
-	historical_data: pd.DataFrame,
+	return by_purchase_date, by_travel_date
+
+
+def _aggregate_purchase_date(data: pd.DataFrame) -> pd.DataFrame:
+	return data \
+		.groupby(PURCHASE_DATE_KEYS, observed=True) \
+		.agg({'Pax': np.sum}) \
+		.reset_index()
+
+
+def _aggregate_travel_date(data: pd.DataFrame) -> pd.DataFrame:
+	return data \
+		.groupby(TRAVEL_DATE_KEYS, observed=True) \
+		.agg({'Pax': np.sum}) \
+		.reset_index()
+
+
+def _reduce_deltas(
+	deltas: Iterable[Tuple[pd.DataFrame, pd.DataFrame]],
+	memory_budget_mb: Optional[int]=None,
+	spill_folder_path: Optional[str]=None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+	'''Sums the purchase date and travel date aggregates of deltas, spilling to disk beyond a memory budget'''
+	by_purchase_date = aggregation.create_aggregate(PURCHASE_DATE_KEYS, ['Pax'], memory_budget_mb, spill_folder_path)
+	by_travel_date = aggregation.create_aggregate(TRAVEL_DATE_KEYS, ['Pax'], memory_budget_mb, spill_folder_path)
+	for delta in deltas:
+		by_purchase_date.add(delta[0])
+		by_travel_date.add(delta[1])
+
+	return by_purchase_date.result(), by_travel_date.result()
+
+
+def load_data(
+	historical_data_by_purchase_date: pd.DataFrame,
+	historical_data_by_travel_date: pd.DataFrame,
 	deltas_folder_paths: str,
-	date_field: str) -> pd.DataFrame:
-
-	# Load and aggregate delta files
-	deltas = []
-	temp = None
-	# Change here
-	for filename in os.listdir(deltas_folder_paths):
-		if not filename.startswith('Tickets_purchased'):
-			continue
-
-		if temp is not None:
-			del temp
-
-		file_path = deltas_folder_paths + '/' + filename
-		temp = pd.read_csv(file_path, sep='\t')
-
-		temp.columns = [col.replace('_', ' ') for col in temp.columns]
-		temp = temp[(temp['Travel Date'] < '2100-01-01') & (~pd.isnull(temp['Travel Date']))]
-		temp = temp[(pd.to_datetime(temp['Travel Date']) >= pd.to_datetime(temp['Purchase Date']))
-			& (pd.to_datetime(temp['Travel Date']) <= (pd.to_datetime(temp['Purchase Date']) + pd.offsets.DateOffset(years=1)))]
-
-		aggregated = temp \
-			.groupby(['Travel Date', 'Country of Sale', 'Orig Country', 'Dest Country']) \
-			.agg({'Pax': np.sum}) \
-			.reset_index()
-
-		deltas.append(aggregated)
-	
+	state_folder_path: Optional[str]=None,
+	workers: Optional[int]=1,
+	memory_budget_mb: Optional[int]=None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+
+	# With a memory budget the aggregations spill hash partitions to disk (next to the state if any)
+	spill_folder_path = os.path.join(state_folder_path, 'spill') if state_folder_path else None
+	reduce = partial(_reduce_deltas, memory_budget_mb=memory_budget_mb, spill_folder_path=spill_folder_path)
+
+	# Load and aggregate delta files, parsing each file once for both aggregates
+	file_paths = _list_delta_files(deltas_folder_paths)
+	if state_folder_path:
+		# Only parse new or changed delta files when a state folder is configured
+		state = incremental.load_incremental(
+			file_paths, _aggregate_delta_file, reduce, state_folder_path, workers, version=PARTIALS_VERSION)
+		deltas = [] if state is None else [state]
+	else:
+		# Each file is filtered and pre-aggregated independently, optionally in worker processes,
+		# and reduced as it arrives
+		deltas = parallel.imap_files(_aggregate_delta_file, file_paths, workers)
+
+	# Key the historical travel months like the deltas, months the aggregation would drop are dropped here
+	historical_data_by_purchase_date = historical_data_by_purchase_date.assign(**{
+		'Travel Month': dates.month_keys(historical_data_by_purchase_date['Travel Month'])})
+	historical_data_by_purchase_date = historical_data_by_purchase_date[
+		historical_data_by_purchase_date['Travel Month'] != dates.MISSING_MONTH]
+
 	# Concatenate, aggregate and return results
 	# Historical data has the data for the purchase months Dec'19 to Mar'20 at travel date level
-	data = pd.concat([historical_data] + deltas, sort=False) \
-			.groupby(['Travel Date', 'Country of Sale', 'Orig Country', 'Dest Country']) \
-			.agg({'Pax': np.sum}) \
-			.reset_index()
-	del historical_data
+	data = reduce(itertools.chain([(historical_data_by_purchase_date, historical_data_by_travel_date)], deltas))
+	del historical_data_by_purchase_date, historical_data_by_travel_date
 
-	# Concatenate and return data
 	return data
 
 
-def previous_year_benchmarks(data: pd.DataFrame, data_2019: pd.DataFrame) -> pd.DataFrame:
-	# Prepare dataframes
-	data = data[(data['Orig Country'] != '0') & (data['Dest Country'] != '0')
-		& (data['Orig Country'] != 0) & (data['Dest Country'] != 0)
-		& (data['Country of Sale'] != 0) & (data['Country of Sale'] != '0')]
+def _baselines_folder_path(state_folder_path: Optional[str], baseline_version: Optional[str]) -> Optional[str]:
+	'''Returns the folder of the 2019 baselines, None (always rebuild them) without a state folder and version'''
+	if not state_folder_path or baseline_version is None:
+		return None
+
+	return os.path.join(state_folder_path, 'baselines')
 
+
+def _purchase_dates_2019(data_2019: pd.DataFrame) -> pd.DataFrame:
+	'''Returns the 2019 bookings by purchase date shifted onto 2020, with their source purchase date'''
 	data_2019 = data_2019[
 		(data_2019['Orig Country'] != '0') & (data_2019['Dest Country'] != '0')
 		& (data_2019['Orig Country'] != 0) & (data_2019['Dest Country'] != 0)
 		& (data_2019['Country of Sale'] != 0) & (data_2019['Country of Sale'] != '0')]
-	
-	prev = pd.concat(
-		[data_2019, data[data['Purchase Date'] > data_2019['Purchase Date'].max()]],
-		sort=False,
-		ignore_index=True)
+
+	shifted = data_2019[PURCHASE_DATE_KEYS + ['Pax']].copy()
+	shifted['Source Date'] = pd.to_datetime(data_2019['Purchase Date'])
+	shifted['Purchase Date'] = dates.shift_years(shifted['Source Date'], 1)
+	shifted['Travel Month'] = dates.shift_month_keys(dates.month_keys(data_2019['Travel Month']), 12)
+
+	return shifted
+
+
+def previous_year_benchmarks(
+	data: pd.DataFrame,
+	data_2019: pd.DataFrame,
+	state_folder_path: Optional[str]=None,
+	baseline_version: Optional[str]=None) -> pd.DataFrame:
+
+	# Prepare dataframes
+	data = data[(data['Orig Country'] != '0') & (data['Dest Country'] != '0')
+		& (data['Orig Country'] != 0) & (data['Dest Country'] != 0)
+		& (data['Country of Sale'] != 0) & (data['Country of Sale'] != '0')]
+
+	# The 2019 numbers are static, so with a state folder they are shifted once per baseline version
+	# and kept in a baseline store
+	baseline_2019 = baseline.load_baseline(
+		_baselines_folder_path(state_folder_path, baseline_version), 'purchase_dates_2019', str(baseline_version),
+		lambda: _purchase_dates_2019(data_2019), 'Source Date')
 	del data_2019
 
-	# Process dates
-	data['Purchase Date'] = pd.to_datetime(data['Purchase Date'])
+	# Process dates, and encode the keys over the categories of the baseline store
+	data = baseline_2019.encode(data.assign(**{'Purchase Date': pd.to_datetime(data['Purchase Date'])}))
 
-	prev['Purchase Date'] = pd.to_datetime(prev['Purchase Date']) + pd.offsets.DateOffset(years=1)
-	prev['Travel Month'] = pd.to_datetime(prev['Travel Month']) + pd.offsets.DateOffset(years=1)
-	prev['Travel Month'] = prev['Travel Month'].dt.strftime('%b %Y')
+	# Previous year numbers are the 2019 baseline, followed by the current numbers after it
+	later = data[data['Purchase Date'] > baseline_2019.last_date]
+	later = later.assign(**{
+		'Purchase Date': dates.shift_years(later['Purchase Date'], 1),
+		'Travel Month': dates.shift_month_keys(later['Travel Month'], 12)})
+	prev = pd.concat([baseline_2019.window(), later], sort=False, ignore_index=True)
 	prev = prev[prev['Purchase Date'] <= data['Purchase Date'].max()]
 	# print("I am here")
 	# prev['Travel Month'] = pd.to_datetime(prev['Travel Month']).dt.strftime('%b %Y')
 
-	# Map previous year numbers
-	prev.rename(columns={'Pax': 'Pax_Prev_Year'}, inplace=True)
-	merged = data.merge(
-		prev,
-		on=['Purchase Date', 'Country of Sale', 'Orig Country', 'Dest Country', 'Travel Month'],
-		how='outer')
-
-	merged[['Pax', 'Pax_Prev_Year']] = merged[['Pax', 'Pax_Prev_Year']].fillna(0)
+	# Map previous year numbers, aligned on integer encoded keys
+	merged = geography.materialize(benchmarks.align_previous_year(data, prev, PURCHASE_DATE_KEYS, 'Pax', 'Pax_Prev_Year'))
 	merged = merged[(merged['Pax'] != 0) | (merged['Pax_Prev_Year'] != 0)]
 	print("Created merged database with Pax this year and last year")
 
 	temp = merged.groupby(['Travel Month']).agg({'Pax':'sum','Pax_Prev_Year':'sum'}).reset_index()
+	temp['Travel Month'] = dates.format_month_keys(temp['Travel Month'])
 	print(temp)
 
 	return merged
 
 
-def previous_travel_date_year_benchmarks(data: pd.DataFrame, data_2019: pd.DataFrame) -> pd.DataFrame:
-	# Prepare dataframes
-	data = data[(data['Orig Country'] != '0') & (data['Dest Country'] != '0')
-		& (data['Orig Country'] != 0) & (data['Dest Country'] != 0)
-		& (data['Country of Sale'] != 0) & (data['Country of Sale'] != '0')]
+def _travel_dates_2019(data_2019: pd.DataFrame) -> pd.DataFrame:
+	'''Returns the 2019 bookings spread over travel dates and shifted onto 2020, with their source travel date'''
 	# Clean up the dataframe from last year (historical monthly purchases by travel month)
 	data_2019 = data_2019[
 		(data_2019['Orig Country'] != '0') & (data_2019['Dest Country'] != '0')
 		& (data_2019['Orig Country'] != 0) & (data_2019['Dest Country'] != 0)
 		& (data_2019['Country of Sale'] != 0) & (data_2019['Country of Sale'] != '0')]
-	
-	# Generate travel date dataframe
-	# Create a date time field for trave month in the prev year data
-	data_2019['Travel Month Date'] = pd.to_datetime(data_2019['Travel Month'])
+
 	# Aggregate to only the level of travel month
-	data_2019 = data_2019 \
-		.groupby(['Country of Sale', 'Orig Country', 'Dest Country', 'Travel Month Date']) \
+	data_2019 = data_2019.assign(**{'Travel Month': dates.month_keys(data_2019['Travel Month'])}) \
+		.groupby(['Country of Sale', 'Orig Country', 'Dest Country', 'Travel Month']) \
 		.agg({'Pax': np.mean}) \
 		.reset_index()
-	# Create empty dataframe for date range belonging to dates of entire year of 2019
-	date_range =pd.DataFrame({'Travel Date': pd.date_range(start='2019-01-01', end='2019-12-31').values}) 
-	# Create the Travel month field from Travel date
-	date_range['Travel Month Date'] = pd.to_datetime(date_range['Travel Date'].dt.strftime('%Y-%m'))
-	# Merge on Travel month
-	data_2019 = data_2019.merge(date_range, on=['Travel Month Date'], how='inner') \
-		.drop(['Travel Month Date'], axis=1)
-
-	# Concatenate dataframes accordingly
-	data['Travel Date'] = pd.to_datetime(data['Travel Date'])
-	# Concatenate all the data from 2019 that is not part of the current master data
+
+	# Spread the monthly numbers over every day of their month in 2019
+	shifted = benchmarks.spread_months_to_days(data_2019, 'Travel Month', 'Travel Date', '2019-01-01', '2019-12-31')
+	shifted['Source Date'] = shifted['Travel Date']
+	shifted['Travel Date'] = dates.shift_years(shifted['Source Date'], 1)
+
+	return shifted
+
+
+def previous_travel_date_year_benchmarks(
+	data: pd.DataFrame,
+	data_2019: pd.DataFrame,
+	state_folder_path: Optional[str]=None,
+	baseline_version: Optional[str]=None) -> pd.DataFrame:
+
+	# Prepare dataframes
+	data = data[(data['Orig Country'] != '0') & (data['Dest Country'] != '0')
+		& (data['Orig Country'] != 0) & (data['Dest Country'] != 0)
+		& (data['Country of Sale'] != 0) & (data['Country of Sale'] != '0')]
+
+	# The 2019 daily numbers are static, so with a state folder they are spread and shifted once per
+	# baseline version and kept in a baseline store
+	baseline_2019 = baseline.load_baseline(
+		_baselines_folder_path(state_folder_path, baseline_version), 'travel_dates_2019', str(baseline_version),
+		lambda: _travel_dates_2019(data_2019), 'Source Date')
+	del data_2019
+
+	# Concatenate all the data from 2019 that is not part of the current master data, with the keys
+	# encoded over the categories of the baseline store
+	data = baseline_2019.encode(data.assign(**{'Travel Date': pd.to_datetime(data['Travel Date'])}))
 	prev = pd.concat(
-		[data_2019[data_2019['Travel Date'] < data['Travel Date'].min()], data],
+		[
+			baseline_2019.window(end=data['Travel Date'].min()),
+			data.assign(**{'Travel Date': dates.shift_years(data['Travel Date'], 1)})
+		],
 		sort=False,
 		ignore_index=True)
-	del data_2019
 
-	# Process dates
-	data['Travel Date'] = pd.to_datetime(data['Travel Date'])
-	# Add one year to get the corresponding value of Travel month this year
-	prev['Travel Date'] = pd.to_datetime(prev['Travel Date']) + pd.offsets.DateOffset(years=1)
 	# Filter out any data in prev df where Travel date is outside the max travel date in the
 	# current df
 	prev = prev[prev['Travel Date'] <= data['Travel Date'].max()]
-	# Map previous year numbers, rename pax to pax_prev_year in prev df
-	prev.rename(columns={'Pax': 'Pax_Prev_Year'}, inplace=True)
-	# Merge dfs of prev and current by an outer join
-	merged = data.merge(
-		prev,
-		on=['Travel Date', 'Country of Sale', 'Orig Country', 'Dest Country'],
-		how='outer')
-	# Fill NAs with 0s
-	merged[['Pax', 'Pax_Prev_Year']] = merged[['Pax', 'Pax_Prev_Year']].fillna(0)
+	# Map previous year numbers as Pax_Prev_Year, outer joined with the current numbers on integer
+	# encoded keys (missing values are 0)
+	merged = geography.materialize(benchmarks.align_previous_year(data, prev, TRAVEL_DATE_KEYS, 'Pax', 'Pax_Prev_Year'))
 	merged = merged[(merged['Pax'] != 0) | (merged['Pax_Prev_Year'] != 0)]
 
 	return merged
@@ -207,33 +296,14 @@ def add_geographical_mappings(
 	country_name_mappings: pd.DataFrame,
 	country_mappings: pd.DataFrame) -> pd.DataFrame:
 
-	country_name_mappings = country_name_mappings[['country_code', 'country_name']]
-	country_mappings = country_name_mappings \
-		.merge(
-			country_mappings[['code_2', 'country', 'region']],
-			how='left',
-			left_on='country_code',
-			right_on='code_2') \
-		.drop(['code_2'], axis=1)
-
-	# Origin country codes
-	data = data.merge(country_mappings, how='left', left_on='Orig Country', right_on='country_name') \
-		.rename(columns={
-			'country_code': 'country_code_origin',
-			'country': 'country_origin',
-			'region': 'region_origin'
-		}) \
-		.drop('country_name', axis=1)
-
-	# Destination country codes
-	data = data.merge(country_mappings, how='left', left_on='Dest Country', right_on='country_name') \
-		.rename(columns={
-			'country_code': 'country_code_destination',
-			'country': 'country_destination',
-			'region': 'region_destination'
-		}) \
-		.drop('country_name', axis=1)
-	# data['dest_country_code'] = joined.country_code
+	# Country names map to 2-letter codes, which index the shared country dimension
+	dimension = geography.CountryDimension(country_mappings, extra_keys=country_name_mappings['country_code'])
+	aliases = country_name_mappings.set_index('country_name')['country_code']
+
+	# Origin and destination country codes, kept as categoricals until the output boundary
+	for name_col, suffix in (('Orig Country', '_origin'), ('Dest Country', '_destination')):
+		dimension.add_attributes(
+			data, name_col, {'code_2': 'country_code', 'country': 'country', 'region': 'region'}, suffix, aliases)
 
 	return data
 
@@ -243,14 +313,9 @@ def add_features(data: pd.DataFrame) -> pd.DataFrame:
 	# data[date_field] = pd.to_datetime(data[date_field])
 
 	# Domestic v. international
-	data['travel_type'] = np.where(
-		data['country_code_origin'] == data['country_code_destination'],
-		'Domestic',
-		np.where(
-			data['region_origin'] == data['region_destination'],
-			'Continental',
-			'Intercontinental'
-		))
+	data['travel_type'] = geography.classify_travel_type(
+		data['country_code_origin'], data['country_code_destination'],
+		data['region_origin'], data['region_destination'])
 
 	return data
 
@@ -265,9 +330,12 @@ def aggregate_country_bookings(data: pd.DataFrame) -> pd.DataFrame:
 
 	result = data[['date', 'country_of_sale', 'country_code_origin', 'country_origin', 'region_origin',
 		'country_code_destination', 'country_destination', 'region_destination', 'travel_type', 'travel_month',
-		'Pax', 'Pax_Prev_Year']]
+		'Pax', 'Pax_Prev_Year']].copy()
+
+	# Travel months are only formatted for reporting
+	result['travel_month'] = dates.format_month_keys(result['travel_month'])
 
-	return result
+	return geography.materialize(result)
 
 
 def aggregate_travel_date_country_bookings(data: pd.DataFrame) -> pd.DataFrame:
@@ -281,7 +349,7 @@ def aggregate_travel_date_country_bookings(data: pd.DataFrame) -> pd.DataFrame:
 		'country_code_destination', 'country_destination', 'region_destination', 'travel_type',
 		'Pax', 'Pax_Prev_Year']]
 
-	return result
+	return geography.materialize(result)
 
 
 def merge_dds_gds_datasets(
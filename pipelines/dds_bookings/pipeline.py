@@ -31,7 +31,7 @@ import os
 import logging
 
 from functools import partial, update_wrapper
-from typing import Dict
+from typing import Dict, Tuple
 
 from kedro.config import ConfigLoader
 from kedro.pipeline import Pipeline, node
@@ -54,32 +54,64 @@ from . import nodes
 # $ kedro run
 
 
-def create_pipeline() -> Pipeline:
+# Views the DDS engine can build from the shared ingest
+VIEWS = ('travel_date', 'purchase_date')
+
+
+def create_ingest_pipeline() -> Pipeline:
+	"""Create the shared DDS ingest.
+
+	Every DDS variant builds this same node, so when several variants run together
+	Kedro keeps a single copy and the delta files are loaded once.
+
+	"""
+
+	return Pipeline([
+			# Parse the delta files once for both the purchase date and the travel date views
+			node(
+				nodes.load_data,
+				[
+					"dds_historicals_by_purchase_date_raw",
+					"dds_historicals_by_travel_date_raw",
+					"params:dds_bookings_folder_path",
+					"params:dds_bookings_state_folder_path",
+					"params:dds_bookings_workers",
+					"params:dds_bookings_memory_budget_mb"
+				],
+				["dds_bookings_by_purchase_date_raw", "dds_bookings_by_travel_date_raw"]
+			),
+		])
+
+
+def create_pipeline(views: Tuple[str, ...]=VIEWS, merge_gds: bool=True) -> Pipeline:
 	"""Create the project's pipeline.
 
+	Args:
+		views: DDS views to build on top of the shared ingest, out of ``VIEWS``.
+		merge_gds: Whether to join the purchase date view with the GDS searches.
+
 	Returns:
 		A ``Pipeline`` object built from a list of nodes.
 
 	"""
 
+	unknown = set(views) - set(VIEWS)
+	if unknown:
+		raise ValueError('Unknown DDS views: %s' % ', '.join(sorted(unknown)))
 
+	pipeline = create_ingest_pipeline()
 
-	return Pipeline([
-			node(
-				lambda: ['Purchase Date', 'Travel Date'],
-				None,
-				['purchase_date_field', 'travel_date_field']
-			),
-			
-			# By travel date
-			node(
-				nodes.load_travel_date_data,
-				["dds_historicals_by_travel_date_raw", "params:dds_bookings_folder_path", "travel_date_field"],
-				"dds_bookings_by_travel_date_raw"
-			),
+	# By travel date
+	if 'travel_date' in views:
+		pipeline += Pipeline([
 			node(
 				nodes.previous_travel_date_year_benchmarks,
-				["dds_bookings_by_travel_date_raw", "dds_historicals_by_purchase_date_2019_raw"],
+				[
+					"dds_bookings_by_travel_date_raw",
+					"dds_historicals_by_purchase_date_2019_raw",
+					"params:dds_bookings_state_folder_path",
+					"params:dds_bookings_baseline_version"
+				],
 				"dds_bookings_by_travel_date_prev_year"
 			),
 			node(
@@ -97,16 +129,19 @@ def create_pipeline() -> Pipeline:
 				["dds_bookings_by_travel_date"],
 				"dds_country_bookings_by_travel_date",
 			),
+		])
 
-			# By purchase date
-			node(
-				nodes.load_data,
-				["dds_historicals_by_purchase_date_raw", "params:dds_bookings_folder_path", "purchase_date_field"],
-				"dds_bookings_by_purchase_date_raw"
-			),
+	# By purchase date
+	if 'purchase_date' in views:
+		pipeline += Pipeline([
 			node(
 				nodes.previous_year_benchmarks,
-				["dds_bookings_by_purchase_date_raw", "dds_historicals_by_purchase_date_2019_raw"],
+				[
+					"dds_bookings_by_purchase_date_raw",
+					"dds_historicals_by_purchase_date_2019_raw",
+					"params:dds_bookings_state_folder_path",
+					"params:dds_bookings_baseline_version"
+				],
 				"dds_bookings_by_purchase_date_prev_year"
 			),
 			node(
@@ -124,17 +159,22 @@ def create_pipeline() -> Pipeline:
 				["dds_bookings_by_purchase_date"],
 				"dds_country_bookings_by_purchase_date",
 			),
+		])
 
-			# Join DDS and GDS datasets
-			node(
-				nodes.merge_dds_gds_datasets,
-				["dds_country_bookings_by_purchase_date", "gds_country_searches", "country_mappings"],
-				"dds_gds_country_dataset",
-				name="merge_dds_gds_datasets"
-			),
-			# node(
-			# 	nodes.merge_dds_gds_datasets,
-			# 	["dds_country_bookings_by_travel_date", "gds_country_searches_by_travel_date", "country_mappings"],
-			# 	"dds_gds_country_dataset_by_travel_date"
-			# ),
-		])
\ No newline at end of file
+		# Join DDS and GDS datasets
+		if merge_gds:
+			pipeline += Pipeline([
+				node(
+					nodes.merge_dds_gds_datasets,
+					["dds_country_bookings_by_purchase_date", "gds_country_searches", "country_mappings"],
+					"dds_gds_country_dataset",
+					name="merge_dds_gds_datasets"
+				),
+				# node(
+				# 	nodes.merge_dds_gds_datasets,
+				# 	["dds_country_bookings_by_travel_date", "gds_country_searches_by_travel_date", "country_mappings"],
+				# 	"dds_gds_country_dataset_by_travel_date"
+				# ),
+			])
+
+	return pipeline
@@ -36,7 +36,7 @@ from typing import Dict
 from kedro.config import ConfigLoader
 from kedro.pipeline import Pipeline, node
 
-from . import nodes
+from ..dds_bookings import pipeline as dds_bookings_pipeline
 
 # Here you can define your data-driven pipeline by importing your functions
 # and adding them to the pipeline as follows:
@@ -54,6 +54,13 @@ from . import nodes
 # $ kedro run
 
 
+# This variant runs the dds_bookings engine, only its configuration lives here
+VARIANT = {
+	'views': ('travel_date', 'purchase_date'),
+	'merge_gds': True,
+}
+
+
 def create_pipeline() -> Pipeline:
 	"""Create the project's pipeline.
 
@@ -62,79 +69,4 @@ def create_pipeline() -> Pipeline:
 
 	"""
 
-
-
-	return Pipeline([
-			node(
-				lambda: ['Purchase Date', 'Travel Date'],
-				None,
-				['purchase_date_field', 'travel_date_field']
-			),
-			
-			# By travel date
-			node(
-				nodes.load_travel_date_data,
-				["dds_historicals_by_travel_date_raw", "params:dds_bookings_folder_path", "travel_date_field"],
-				"dds_bookings_by_travel_date_raw"
-			),
-			node(
-				nodes.previous_travel_date_year_benchmarks,
-				["dds_bookings_by_travel_date_raw", "dds_historicals_by_purchase_date_2019_raw"],
-				"dds_bookings_by_travel_date_prev_year"
-			),
-			node(
-				nodes.add_geographical_mappings,
-				["dds_bookings_by_travel_date_prev_year", "dds_country_mappings", "country_mappings"],
-				"dds_bookings_by_travel_date_geo",
-			),
-			node(
-				nodes.add_features,
-				["dds_bookings_by_travel_date_geo"],
-				"dds_bookings_by_travel_date",
-			),
-			node(
-				nodes.aggregate_travel_date_country_bookings,
-				["dds_bookings_by_travel_date"],
-				"dds_country_bookings_by_travel_date",
-			),
-
-			# By purchase date
-			node(
-				nodes.load_data,
-				["dds_historicals_by_purchase_date_raw", "params:dds_bookings_folder_path", "purchase_date_field"],
-				"dds_bookings_by_purchase_date_raw"
-			),
-			node(
-				nodes.previous_year_benchmarks,
-				["dds_bookings_by_purchase_date_raw", "dds_historicals_by_purchase_date_2019_raw"],
-				"dds_bookings_by_purchase_date_prev_year"
-			),
-			node(
-				nodes.add_geographical_mappings,
-				["dds_bookings_by_purchase_date_prev_year", "dds_country_mappings", "country_mappings"],
-				"dds_bookings_by_purchase_date_geo",
-			),
-			node(
-				nodes.add_features,
-				["dds_bookings_by_purchase_date_geo"],
-				"dds_bookings_by_purchase_date",
-			),
-			node(
-				nodes.aggregate_country_bookings,
-				["dds_bookings_by_purchase_date"],
-				"dds_country_bookings_by_purchase_date",
-			),
-
-			# Join DDS and GDS datasets
-			node(
-				nodes.merge_dds_gds_datasets,
-				["dds_country_bookings_by_purchase_date", "gds_country_searches", "country_mappings"],
-				"dds_gds_country_dataset",
-				name="merge_dds_gds_datasets"
-			),
-			# node(
-			# 	nodes.merge_dds_gds_datasets,
-			# 	["dds_country_bookings_by_travel_date", "gds_country_searches_by_travel_date", "country_mappings"],
-			# 	"dds_gds_country_dataset_by_travel_date"
-			# ),
-		])
\ No newline at end of file
+	return dds_bookings_pipeline.create_pipeline(**VARIANT)
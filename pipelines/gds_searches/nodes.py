@@ -1,9 +1,13 @@
+import collections
 import logging
 import numpy as np
 import os
 import pandas as pd
 
-from typing import Any, Dict
+from functools import partial
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ..common import aggregation, cache, dates, geography, incremental, metrics, parallel
 
 # Create logger
 log = logging.getLogger(__name__)
@@ -16,112 +20,249 @@ def rt_market(orig_array, dest_array):
     return market_array
 
 
-def combine_data(
-	gds_search_folder_path: str,
-	historical_data: pd.DataFrame,
-	airport_mappings: pd.DataFrame,
-	multiple_airport_cities: pd.DataFrame) -> pd.DataFrame:
+SEARCH_KEYS = ['pos', 'date_request', 'travel_month', 'country_code_origin', 'country_code_destination']
 
-	airport_mappings = airport_mappings[~pd.isnull(airport_mappings['iata_code'])]
-	def _process_file(filepath):
-		# Each chunk is in df format
-		df_list = []
+# Bump whenever the layout of the cached search aggregates changes
+PARTIALS_VERSION = '3'
 
-		chunksize = 5000000
-		df_chunk = pd.read_csv(filepath, chunksize=chunksize)
-		i = 0
-		j = 0
-		print(filepath)
-		for chunk in df_chunk:
-			chunk.dropna(inplace=True)
-
-			# Apply country mappings
-			chunk = map_countries(chunk, airport_mappings)
-			chunk = handle_airport_cities(chunk, multiple_airport_cities)
-			chunk['travel_month'] = pd.to_datetime(chunk['request_outbound_date'].astype(int).astype(str)).dt.strftime('%b %Y')
-			print("France rows")
-			print(chunk[chunk.country_code_origin=="FR"].shape)
-			if 'number_of_request' in chunk:
-				chunk.rename(columns={'number_of_request': 'number_of_requests'}, inplace=True)
-
-			chunk_agg = chunk \
-				.groupby(['pos', 'date_request', 'travel_month', 'country_code_origin', 'country_code_destination']) \
-				.agg({'number_of_requests': np.sum}) \
-				.reset_index()
-			print(chunk[chunk.country_code_origin == "FR"].shape)
-			i += len(chunk_agg)
-			j += len(chunk)
-			print(i, j)
-
-			del chunk
-			df_list.append(chunk_agg)
-		
-		return pd.concat(df_list, ignore_index=True)
+CHUNK_ROWS = 5000000
+# Rough peak memory of a search row while its chunk is mapped and aggregated
+CHUNK_ROW_BYTES = 400
 
-	# Load winglet data files
-	# dfs = [historical_data]
-	#Starting from scratch as all historical winglet files have been revived
-	dfs = []
-	print(gds_search_folder_path)
-	for file_name in os.listdir(gds_search_folder_path):
-		if file_name.endswith('.csv') and file_name != 'winglet_historical.csv':
-			file_path = gds_search_folder_path + '/' + file_name
-			print(file_name,file_path)
-			dfs.append(_process_file(file_path))
 
-	# Combine and aggregate data
-	data = pd.concat(dfs) \
-		.groupby(['pos', 'date_request', 'travel_month', 'country_code_origin', 'country_code_destination']) \
-		.agg({'number_of_requests': np.sum}) \
-		.reset_index()
+def build_country_lookup(airport_mappings: pd.DataFrame, multiple_airport_cities: pd.DataFrame) -> pd.Series:
+	'''Returns the country code of every airport and multiple airport city code, indexed by code.
 
-	# Filter out searches more than one year out
-	data['date_request'] = pd.to_datetime(data.date_request.astype(str))
-	data = data[(pd.to_datetime(data['travel_month']) >= (data['date_request'] - pd.to_timedelta(data['date_request'].dt.day - 1, unit='day')))
-		& (pd.to_datetime(data['travel_month']) <= (data['date_request'] + pd.offsets.DateOffset(years=1)))]
+	The airport country wins and multiple airport cities fill codes without one.
+	'''
+	airports = airport_mappings[~pd.isnull(airport_mappings['iata_code'])]
+	duplicated = airports['iata_code'].duplicated()
+	if duplicated.any():
+		log.warning('%d duplicated airport codes, keeping the first country of each', duplicated.sum())
+	airports = airports[~duplicated].set_index('iata_code')['iso_country']
 
-	return data
+	cities = multiple_airport_cities.fillna('NA').drop_duplicates('city').set_index('city')['country']
+
+	lookup = airports.combine_first(cities)
+	return lookup[~pd.isnull(lookup)]
 
 
-def map_countries(data: pd.DataFrame, airports: pd.DataFrame) -> pd.DataFrame:
-	data = data.merge(
-		airports[['iata_code', 'iso_country']].rename(columns={'iso_country': 'country_code'}),
-		how='left',
-		left_on='request_origin',
-		right_on='iata_code')
+def map_country_codes(data: pd.DataFrame, country_lookup: pd.Series) -> pd.DataFrame:
+	'''Adds origin and destination country codes (as categoricals) from a country lookup, in place'''
+	categories = pd.Index(country_lookup.unique())
+	codes = np.append(categories.get_indexer(country_lookup.values), -1)
 
-	data = data.merge(
-		airports[['iata_code', 'iso_country']].rename(columns={'iso_country': 'country_code'}),
-		how='left',
-		left_on='request_destination',
-		right_on='iata_code',
-		suffixes=('_origin', '_destination'))	
+	for end in ('origin', 'destination'):
+		data['country_code_' + end] = pd.Categorical.from_codes(
+			codes[country_lookup.index.get_indexer(data['request_' + end])], categories=categories)
 
 	return data
 
 
-def handle_airport_cities(data: pd.DataFrame, multiple_airport_cities: pd.DataFrame) -> pd.DataFrame:
-	multiple_airport_cities = multiple_airport_cities.fillna('NA')[['city', 'country']]
-	multiple_airport_cities.columns = ['city_temp', 'country_temp']
-	
-	# Update origin countries and continents accordingly
-	data = data.merge(multiple_airport_cities, left_on='request_origin', right_on='city_temp', how='left')
-	data['country_code_origin'] = data['country_code_origin'].fillna(data['country_temp'])
-	data = data.drop([col for col in data.columns if col.endswith('_temp')], axis=1)
+def _search_ranges(
+	file_paths: List[str],
+	workers: int=1,
+	memory_budget_mb: Optional[int]=None) -> List[Tuple[str, int, Optional[int]]]:
+	'''Returns the (file path, start, end) byte ranges to aggregate, one per file when running serially.
+
+	With several workers large files are split so that the work spreads evenly across
+	them, and so that no range takes more than half of a worker's memory budget.
+	'''
+	if not workers or workers <= 1:
+		return [(file_path, 0, None) for file_path in file_paths]
+
+	sizes = [os.path.getsize(file_path) for file_path in file_paths]
+	range_bytes = max(-(-sum(sizes) // workers), 1)
+	if memory_budget_mb:
+		range_bytes = min(range_bytes, max(memory_budget_mb * 2**20 // workers // 2, 1))
+
+	ranges = []
+	for file_path, size in zip(file_paths, sizes):
+		ranges += [(file_path, start, end) for start, end in parallel.split_file(file_path, -(-size // range_bytes))]
+
+	return ranges
+
+
+def _chunksize(workers: int=1, memory_budget_mb: Optional[int]=None) -> int:
+	'''Returns the number of rows per chunk that fits half of a worker's memory budget'''
+	if not memory_budget_mb:
+		return CHUNK_ROWS
+
+	return int(max(min(CHUNK_ROWS, memory_budget_mb * 2**20 // max(workers or 1, 1) // 2 // CHUNK_ROW_BYTES), 1000))
+
 
-	# Update destination countries and continents accordingly
-	data = data.merge(multiple_airport_cities, left_on='request_destination', right_on='city_temp', how='left')
-	data['country_code_destination'] = data['country_code_destination'].fillna(data['country_temp'])
-	data = data.drop([col for col in data.columns if col.endswith('_temp')], axis=1)
+def _chunk_metrics(
+	search_range: Tuple[str, int, Optional[int]],
+	rows_read: int,
+	chunk_agg: pd.DataFrame,
+	countries: List[str]) -> Dict[str, Any]:
+	'''Returns the metrics of a chunk, from its aggregate and its number of search rows per key'''
+	record = {
+		'file': os.path.basename(search_range[0]),
+		'start': search_range[1],
+		'rows_read': rows_read,
+		'rows_aggregated': int(chunk_agg['search_rows'].sum()),
+		'distinct_keys': len(chunk_agg),
+	}
+
+	if countries:
+		rows_by_origin = chunk_agg.groupby('country_code_origin', observed=True)['search_rows'].sum()
+		for country in countries:
+			record['rows_origin_' + country] = int(rows_by_origin.get(country, 0))
+
+	return record
+
+
+def _aggregate_search_range(
+	search_range: Tuple[str, int, Optional[int]],
+	country_lookup: pd.Series,
+	chunksize: int=CHUNK_ROWS,
+	metrics_countries: Optional[List[str]]=None) -> Tuple[pd.DataFrame, List[Dict[str, Any]]]:
+	'''Aggregates the searches of a (file path, start, end) byte range, end None for the whole file.
+
+	Returns the aggregate and, when metrics_countries is set (possibly empty), the
+	metrics of every chunk.
+	'''
+	filepath, start, end = search_range
+
+	# Fold each chunk's aggregate into a running total rather than keeping every chunk
+	file_aggregate = aggregation.RunningAggregate(SEARCH_KEYS, ['number_of_requests'])
+	chunk_metrics = []
+
+	if end is None:
+		df_chunk = pd.read_csv(filepath, chunksize=chunksize)
+	else:
+		df_chunk = parallel.read_csv_range(filepath, start, end, chunksize=chunksize)
+	for chunk in df_chunk:
+		rows_read = len(chunk)
+		chunk.dropna(inplace=True)
+
+		# Apply country mappings
+		chunk = map_country_codes(chunk, country_lookup)
+		chunk['travel_month'] = dates.yyyymmdd_month_keys(chunk['request_outbound_date'])
+		if 'number_of_request' in chunk:
+			chunk.rename(columns={'number_of_request': 'number_of_requests'}, inplace=True)
+
+		# Counting the rows behind every key in the same pass gives the metrics for free
+		chunk_agg = chunk \
+			.groupby(SEARCH_KEYS, observed=True) \
+			.agg(number_of_requests=('number_of_requests', 'sum'), search_rows=('number_of_requests', 'size')) \
+			.reset_index()
+
+		del chunk
+		if metrics_countries is not None:
+			chunk_metrics.append(_chunk_metrics(search_range, rows_read, chunk_agg, metrics_countries))
+		file_aggregate.add(chunk_agg)
+
+	return file_aggregate.result(), chunk_metrics
+
+
+def _aggregate_search_files(
+	file_paths: List[str],
+	country_lookup: pd.Series,
+	workers: int=1,
+	memory_budget_mb: Optional[int]=None,
+	metrics_config: Optional[Dict[str, Any]]=None) -> Iterator[pd.DataFrame]:
+	'''Yields the aggregated searches of every file in order.
+
+	Files, or byte ranges of them, are aggregated across the workers and the partial
+	aggregates of a file are folded together as they arrive. With a metrics config
+	({'countries': [...], 'file_path': ...}, both optional) the chunk metrics are
+	emitted as structured logs and, with a file path, appended to a JSON lines file.
+	'''
+	ranges = _search_ranges(file_paths, workers, memory_budget_mb)
+	range_counts = collections.Counter(file_path for file_path, _, _ in ranges)
+
+	metrics_countries = None if metrics_config is None else list(metrics_config.get('countries') or [])
+	aggregate_range = partial(
+		_aggregate_search_range,
+		country_lookup=country_lookup,
+		chunksize=_chunksize(workers, memory_budget_mb),
+		metrics_countries=metrics_countries)
+	range_aggregates = parallel.imap_files(aggregate_range, ranges, workers)
+	for file_path in file_paths:
+		file_aggregate = aggregation.RunningAggregate(SEARCH_KEYS, ['number_of_requests'])
+		for _ in range(range_counts[file_path]):
+			range_aggregate, chunk_metrics = next(range_aggregates)
+			if metrics_config is not None:
+				metrics.emit('gds_searches_chunk', chunk_metrics, metrics_config.get('file_path'))
+			file_aggregate.add(range_aggregate)
+		yield file_aggregate.result()
+
+
+def _reduce_searches(
+	aggregates: Iterable[pd.DataFrame],
+	memory_budget_mb: Optional[int]=None,
+	spill_folder_path: Optional[str]=None) -> pd.DataFrame:
+	# Aggregates are folded into one running total, bounded by the number of distinct keys,
+	# or spilled to disk by hash partition beyond a memory budget
+	searches = aggregation.create_aggregate(SEARCH_KEYS, ['number_of_requests'], memory_budget_mb, spill_folder_path)
+	for aggregate in aggregates:
+		searches.add(aggregate)
+
+	return searches.result()
+
+
+def combine_data(
+	gds_search_folder_path: str,
+	historical_data: pd.DataFrame,
+	airport_mappings: pd.DataFrame,
+	multiple_airport_cities: pd.DataFrame,
+	state_folder_path: str=None,
+	workers: int=1,
+	memory_budget_mb: int=None,
+	metrics_config: Dict[str, Any]=None) -> pd.DataFrame:
+
+	# Resolve airport and city codes to countries once per run
+	reference_digest = cache.frame_digest(airport_mappings, multiple_airport_cities)
+	country_lookup = cache.load_cached(
+		state_folder_path, 'country_lookup', reference_digest,
+		lambda: build_country_lookup(airport_mappings, multiple_airport_cities))
+
+	# Load winglet data files
+	# dfs = [historical_data]
+	#Starting from scratch as all historical winglet files have been revived
+	file_paths = []
+	log.info('Loading GDS search files from %s', gds_search_folder_path)
+	for file_name in os.listdir(gds_search_folder_path):
+		if file_name.endswith('.csv') and file_name != 'winglet_historical.csv':
+			file_path = gds_search_folder_path + '/' + file_name
+			log.info('Found GDS search file %s', file_path)
+			file_paths.append(file_path)
+
+	spill_folder_path = os.path.join(state_folder_path, 'spill') if state_folder_path else None
+	reduce = partial(_reduce_searches, memory_budget_mb=memory_budget_mb, spill_folder_path=spill_folder_path)
+
+	if state_folder_path:
+		# Only parse new or changed files when a state folder is configured, the aggregate of
+		# every file is kept as parquet and rebuilt whenever the reference mappings change
+		data = incremental.load_incremental(
+			file_paths, None, reduce, os.path.join(state_folder_path, 'searches'),
+			key=reference_digest,
+			process_files=lambda paths: _aggregate_search_files(paths, country_lookup, workers, memory_budget_mb, metrics_config),
+			partial_format='parquet',
+			version=PARTIALS_VERSION)
+		if data is None:
+			data = reduce([])
+	else:
+		data = reduce(_aggregate_search_files(file_paths, country_lookup, workers, memory_budget_mb, metrics_config))
+
+	data = geography.materialize(data)
+
+	# Filter out searches more than one year out, travel months stay month keys until the country searches
+	request_month = dates.yyyymmdd_month_keys(data['date_request'])
+	data = data[(data['travel_month'] >= request_month) & (data['travel_month'] <= request_month + 12)].copy()
+	data['date_request'] = dates.decode_yyyymmdd(data['date_request'])
 
 	return data
 
 
 def add_features(data: pd.DataFrame, country_mappings: pd.DataFrame) -> pd.DataFrame:
 	# Date processing
-	print("At the stage of adding features")
-	print(data[data.country_code_origin=="FR"].shape)
-	data['request_date'] = pd.to_datetime(data.date_request.astype(str))
+	if pd.api.types.is_numeric_dtype(data['date_request']):
+		data['request_date'] = dates.decode_yyyymmdd(data['date_request'])
+	else:
+		data['request_date'] = pd.to_datetime(data['date_request'])
 
 	# data['request_outbound_date'] = pd.to_datetime(data.request_outbound_date.astype(str))
 	# data['travel_month'] = data['request_outbound_date'].dt.strftime('%b %Y')
@@ -134,30 +275,15 @@ def add_features(data: pd.DataFrame, country_mappings: pd.DataFrame) -> pd.DataF
 	# data['request_outbound_week'] = data.request_outbound_date - pd.to_timedelta(data.request_outbound_date.dt.dayofweek, unit='d')
 	# data['month_request'] = (data['date_request'] / 100).astype(int)
 
-	data = data \
-		.merge(
-			country_mappings[['code_2', 'country', 'continent', 'region']],
-			how='left',
-			left_on='country_code_origin',
-			right_on='code_2') \
-		.drop('code_2', axis=1) \
-		.merge(
-			country_mappings[['code_2', 'country', 'continent', 'region']],
-			how='left',
-			left_on='country_code_destination',
-			right_on='code_2',
-			suffixes=('_origin', '_destination')) \
-		.drop('code_2', axis=1)
+	# Country attributes from the shared country dimension, kept as categoricals until the output boundary
+	dimension = geography.CountryDimension(country_mappings)
+	for suffix in ('_origin', '_destination'):
+		dimension.add_attributes(data, 'country_code' + suffix, ['country', 'continent', 'region'], suffix)
 
 	# Domestic v. international
-	data['travel_type'] = np.where(
-		data['country_code_origin'] == data['country_code_destination'],
-		'Domestic',
-		np.where(
-			data['region_origin'] == data['region_destination'],
-			'Continental',
-			'Intercontinental'
-		))
+	data['travel_type'] = geography.classify_travel_type(
+		data['country_code_origin'], data['country_code_destination'],
+		data['region_origin'], data['region_destination'])
 
 	return data
 
@@ -168,8 +294,13 @@ def aggregate_country_searches(data: pd.DataFrame, date_field: str) -> pd.DataFr
 			date_field: 'date',
 			'pos': 'country_of_sale'}) \
 		.groupby(['date', 'country_of_sale', 'country_code_origin', 'country_origin', 'region_origin',
-				'country_code_destination', 'country_destination', 'region_destination', 'travel_type', 'travel_month']) \
+				'country_code_destination', 'country_destination', 'region_destination', 'travel_type', 'travel_month'],
+			observed=True) \
 		.agg({'number_of_requests': 'sum'}) \
-		.fillna(0)
+		.fillna(0) \
+		.reset_index()
+
+	# Travel months are only formatted for reporting
+	aggregated['travel_month'] = dates.format_month_keys(aggregated['travel_month'])
 
-	return aggregated.reset_index()
+	return geography.materialize(aggregated)
@@ -72,22 +72,13 @@ def create_pipeline() -> Pipeline:
 			),
 			node(
 				nodes.combine_data,
-				["params:gds_searches_folder_path", "winglet_historical", "airport_codes", "multiple_airport_cities"],
+				["params:gds_searches_folder_path", "winglet_historical", "airport_codes", "multiple_airport_cities",
+					"params:gds_searches_state_folder_path", "params:gds_searches_workers", "params:gds_searches_memory_budget_mb",
+					"params:gds_searches_metrics"],
 				"merged_gds_searches",
 			),
-			# node(
-			# 	nodes.map_countries,
-			# 	["merged_gds_searches", "airport_codes"],
-			# 	"merged_gds_searches_countries",
-			# ),
-			# node(
-			# 	nodes.handle_airport_cities,
-			# 	["merged_gds_searches_countries", "multiple_airport_cities"],
-			# 	"airport_city_mapped"
-			# ),
 			node(
 				nodes.add_features,
-				# ["airport_city_mapped", "country_mappings"],
 				["merged_gds_searches", "country_mappings"],
 				"gds_searches",
 			),
@@ -9,8 +9,7 @@ from rpy2 import robjects
 from rpy2.robjects import packages
 from typing import Any, Dict, List
 
-# Import project utils
-from src.iata_covid import utils
+from ..common import encoding, geography
 
 
 # Create logger
@@ -105,27 +104,39 @@ def compute_market_time_series(data: pd.DataFrame) -> pd.DataFrame:
 		'Sched_Flight_Count', 'Cancellation_Count', 'Sched_Flight_Count_Prev_Year', 'Cancellation_Count_Prev_Year']
 	value_columns = [col for col in potential_value_columns if col in data.columns]
 
-	# Compute markets
-	data['Market'] = utils.rt_market(data.Country_Code_Origin, data.Country_Code_Destination)
-	data['Market_Name'] = np.where(
-			data.Country_Code_Origin < data.Country_Code_Destination,
-			data.Country_Origin + '-' + data.Country_Destination,
-			data.Country_Destination + '-' + data.Country_Origin)
+	# Compute markets as integer ids; names, codes and regions of the two countries of a market are
+	# looked up per country and only built for the aggregated rows
+	markets = geography.Markets(data.Country_Code_Origin, data.Country_Code_Destination)
+	country_names = markets.lookup(data.Country_Origin, data.Country_Destination)
+	regions = markets.lookup(data.Region_Origin, data.Region_Destination)
 
-	# Assign order to geographical fields based on market logic
-	for base_col in ('Country_Code', 'Region'):
-		for i, suffix in enumerate(('_Origin', '_Destination')):
-			origin = data[base_col + '_Origin']
-			destination = data[base_col + '_Destination']
-
-			data[base_col + '_1'] = np.where(data['Country_Code_Origin'] < data['Country_Code_Destination'], origin, destination)
-			data[base_col + '_2'] = np.where(data['Country_Code_Origin'] >= data['Country_Code_Destination'], origin, destination)
-
-	result = data \
-		.groupby(['Date', 'Market', 'Market_Name', 'Travel_Type', 'Country_Code_1', 'Region_1', 'Country_Code_2', 'Region_2']) \
-		.agg({col: np.sum for col in value_columns}) \
+	data = data[['Date', 'Travel_Type'] + value_columns].assign(Market=markets.ids)
+	result = data[data.Market >= 0] \
+		.groupby(['Date', 'Market', 'Travel_Type']) \
+		.agg({col: 'sum' for col in value_columns}) \
 		.reset_index()
 
+	# Assign order to geographical fields based on market logic
+	market_ids = result.Market.values
+	first, second = markets.split(market_ids)
+	result = pd.concat(
+		[
+			pd.DataFrame({
+				'Date': result.Date,
+				'Market': markets.names(market_ids),
+				'Market_Name': markets.names(market_ids, country_names),
+				'Travel_Type': result.Travel_Type,
+				'Country_Code_1': markets.countries.values[first],
+				'Region_1': regions[first],
+				'Country_Code_2': markets.countries.values[second],
+				'Region_2': regions[second]}),
+			result[value_columns]
+		],
+		axis=1)
+
+	# Routes of countries without a name or region are left out, like rows with null keys
+	result = result[~pd.isnull(result[['Market_Name', 'Region_1', 'Region_2']]).any(axis=1)].reset_index(drop=True)
+
 	return result
 
 
@@ -183,16 +194,30 @@ def consolidate_market_time_series(
 	route_oag_time_series = route_oag_time_series[index_cols
 		+ ['Sched_Flight_Count', 'Cancellation_Count', 'Sched_Flight_Count_Prev_Year', 'Cancellation_Count_Prev_Year']]
 
-	# Merge datasets
-	data = route_demand_time_series \
-		.merge(route_trips_time_series, how='outer', on=index_cols) \
-		.merge(route_oag_time_series, how='outer', on=index_cols) \
-		.merge(covid_time_series.rename(columns={'Country_Code': 'Country_Code_1'}), how='left', on=['Country_Code_1', 'Date']) \
-		.merge(covid_time_series.rename(columns={'Country_Code': 'Country_Code_2'}), how='left', on=['Country_Code_2', 'Date'], suffixes=('_1', '_2')) \
-		.merge(google_trends.rename(columns={'Country_Code': 'Country_Code_1'}), how='left', on=['Country_Code_1', 'Date']) \
-		.merge(google_trends.rename(columns={'Country_Code': 'Country_Code_2'}), how='left', on=['Country_Code_2', 'Date'], suffixes=('_1', '_2')) \
-		.merge(government_response_time_series.rename(columns={'Country_Code': 'Country_Code_1'}), how='left', on=['Country_Code_1', 'Date']) \
-		.merge(government_response_time_series.rename(columns={'Country_Code': 'Country_Code_2'}), how='left', on=['Country_Code_2', 'Date'], suffixes=('_1', '_2'))
+	# Align the route sources on their distinct (date, market) keys and gather every source's values
+	# onto them, building the output frame once
+	route_sources = [route_demand_time_series, route_trips_time_series, route_oag_time_series]
+	data, route_rows = encoding.align_frames(route_sources, index_cols)
+	columns = {col: data[col] for col in index_cols}
+	for source, rows in zip(route_sources, route_rows):
+		for col in source.columns.drop(index_cols):
+			columns[col] = source[col].array.take(rows, allow_fill=True)
+
+	# Country level features: the rows of every source for each (country, date) are found once,
+	# then gathered for the first and second country of every market
+	country_sources = [covid_time_series, google_trends, government_response_time_series]
+	countries, country_rows = encoding.align_frames(country_sources, ['Country_Code', 'Date'])
+	country_positions = {
+		suffix: encoding.lookup_rows(data, ['Country_Code' + suffix, 'Date'], countries, ['Country_Code', 'Date'])
+		for suffix in ('_1', '_2')}
+	for source, rows in zip(country_sources, country_rows):
+		for suffix, positions in country_positions.items():
+			source_rows = np.full(len(positions), -1, dtype=np.int64)
+			source_rows[positions >= 0] = rows[positions[positions >= 0]]
+			for col in source.columns.drop(['Country_Code', 'Date']):
+				columns[col + suffix] = source[col].array.take(source_rows, allow_fill=True)
+
+	data = pd.DataFrame(columns)
 
 	# Capitalize columns
 	data.columns = ['_'.join([word.capitalize() for word in col.split('_')]) for col in data.columns]
@@ -2,48 +2,95 @@ import logging
 import numpy as np
 import os
 import pandas as pd
+import re
 
-from typing import Any, Dict, Tuple
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from ..common import benchmarks, dates, geography, incremental
 
 # Create logger
 log = logging.getLogger(__name__)
 
+# Columns used from the OAG extracts, with their types
+OAG_DATE_COLUMNS = ['DepLocalDate']
+OAG_DTYPES = {
+    'DepCountryCode': str,
+    'ArrCountryCode': str,
+    'SchedFlightCount': np.float64,
+    'CancellationCount': np.float64,
+}
+SNAPSHOT_DATE_PATTERN = re.compile(r'(\d{4})-?(\d{2})-?(\d{2})')
 
-def load_latest_date_file(oag_data_folder_path: str) -> pd.DataFrame:
-    # Load latest file
-    dfs = []
-    for filename in os.listdir(oag_data_folder_path):
-        if not filename.endswith('.csv'):
-            continue
+# Bump whenever the layout of the stored snapshots changes
+SNAPSHOTS_VERSION = '1'
 
-        file_path = oag_data_folder_path + '/' + filename
-        dfs.append(pd.read_csv(file_path))
 
-    data = pd.concat(dfs)
-    return data
+def _snapshot_date(file_path: str) -> Tuple[str, float]:
+    '''Returns the extract date in a file name (YYYYMMDD or YYYY-MM-DD, '' if none) and the file mtime'''
+    match = SNAPSHOT_DATE_PATTERN.search(os.path.basename(file_path))
+    return ''.join(match.groups()) if match else '', os.path.getmtime(file_path)
+
+
+def _read_oag_file(file_path: str) -> pd.DataFrame:
+    # Only read the used columns, with declared types; 'NA' is a country code (Namibia), not a null
+    return pd.read_csv(
+        file_path,
+        usecols=OAG_DATE_COLUMNS + list(OAG_DTYPES),
+        dtype=OAG_DTYPES,
+        parse_dates=OAG_DATE_COLUMNS,
+        keep_default_na=False,
+        na_values=[''])
+
+
+def _concat_snapshots(snapshots: Iterable[pd.DataFrame]) -> pd.DataFrame:
+    return pd.concat(list(snapshots), ignore_index=True, sort=False)
+
+
+def load_latest_date_file(
+        oag_data_folder_path: str,
+        state_folder_path: Optional[str] = None,
+        all_snapshots: bool = False) -> pd.DataFrame:
+    file_paths = [oag_data_folder_path + '/' + filename for filename in sorted(os.listdir(oag_data_folder_path))
+                  if filename.endswith('.csv')]
+    if not file_paths:
+        raise ValueError('No OAG files found in %s' % oag_data_folder_path)
+
+    # Load latest file, dated by its name or else by its modification time
+    if not all_snapshots:
+        file_path = max(file_paths, key=_snapshot_date)
+        log.info('Loading the latest OAG snapshot %s', os.path.basename(file_path))
+        return _read_oag_file(file_path)
+
+    # Load every snapshot, with a state folder only reading new or changed files into a parquet store
+    if state_folder_path:
+        return incremental.load_incremental(
+            file_paths, _read_oag_file, _concat_snapshots, os.path.join(state_folder_path, 'snapshots'),
+            partial_format='parquet', version=SNAPSHOTS_VERSION)
+
+    return _concat_snapshots(_read_oag_file(file_path) for file_path in file_paths)
 
 
 def previous_year_capacity(data: pd.DataFrame) -> pd.DataFrame:
     # Process dates
     data['DepLocalDate'] = pd.to_datetime(data['DepLocalDate'])
-    data['futureDate'] = data['DepLocalDate'] + pd.DateOffset(years=1)
-
-    # Get previous year figures
-    data = data.merge(
-        data.copy(),
-        how='outer',
-        left_on=['DepCountryCode', 'ArrCountryCode', 'DepLocalDate'],
-        right_on=['DepCountryCode', 'ArrCountryCode', 'futureDate'],
-        suffixes=('', '_PrevYear'))
-    data.loc[pd.isnull(data['DepLocalDate']), 'DepLocalDate'] = data['futureDate_PrevYear']
 
-    # Fill nulls with zeros for dates for which we have previous data for
-    prev_cols = ['SchedFlightCount_PrevYear', 'CancellationCount_PrevYear']
+    # Previous year capacity, keyed on the date a year later
+    keys = ['DepCountryCode', 'ArrCountryCode', 'DepLocalDate']
+    prev_cols = ['SchedFlightCount', 'CancellationCount']
+    previous = data[keys + prev_cols].assign(DepLocalDate=dates.shift_years(data['DepLocalDate'], 1))
 
-    # mask = data.previousDate_PrevYear >= data.DepLocalDate.min()
-    # data.loc[mask, prev_cols] = data.loc[mask, prev_cols].fillna(0)
+    # Get previous year figures by key lookup rather than merging the data with itself; dates with
+    # previous data only become rows of their own
+    looked_up, previous_only = benchmarks.lookup_previous_year(data, previous, keys, prev_cols)
+    del previous
 
-    data[prev_cols] = data[prev_cols].fillna(0)
+    data = data[keys + prev_cols].copy()
+    for col in prev_cols:
+        data[col + '_PrevYear'] = looked_up[col].values
+    data = pd.concat(
+        [data, previous_only.rename(columns={col: col + '_PrevYear' for col in prev_cols})],
+        sort=False,
+        ignore_index=True)
 
     # Keep and rename necessary columns
     data = data[['DepLocalDate', 'DepCountryCode', 'ArrCountryCode', 'SchedFlightCount',
@@ -176,90 +223,39 @@ def add_geographical_mappings(data: pd.DataFrame, country_mappings: pd.DataFrame
     # 	'SchedFlightCount': 'sched_flight_count',
     # 	'CancellationCount': 'cancellation_count'}) \
 
-    # Add mappings
-    data = data \
-        .merge(
-        country_mappings[['code_2', 'country', 'region']],
-        how='left',
-        left_on='country_code_origin',
-        right_on='code_2') \
-        .drop(['code_2'], axis=1) \
-        .merge(
-        country_mappings[['code_2', 'country', 'region']],
-        how='left',
-        left_on='country_code_destination',
-        right_on='code_2',
-        suffixes=('_origin', '_destination')) \
-        .drop(['code_2'], axis=1) \
- \
+    # Add mappings from the shared country dimension
+    dimension = geography.CountryDimension(country_mappings)
+    for suffix in ('_origin', '_destination'):
+        dimension.add_attributes(data, 'country_code' + suffix, ['country', 'region'], suffix)
+
     # Domestic v. international
-    data['travel_type'] = np.where(
-        data['country_code_origin'] == data['country_code_destination'],
-        'Domestic',
-        np.where(
-            data['region_origin'] == data['region_destination'],
-            'Continental',
-            'Intercontinental'
-        ))
+    data['travel_type'] = geography.classify_travel_type(
+        data['country_code_origin'], data['country_code_destination'],
+        data['region_origin'], data['region_destination'])
 
     # Capitalize columns
     data.columns = ['_'.join([word.capitalize() for word in col.split('_')]) for col in
                     data.columns]
 
-    return data
+    # oag_dataset is shared with other pipelines, so hand out plain strings
+    return geography.materialize(data)
 
 
 def aggregate_data_by_orig_dest(data: pd.DataFrame) -> pd.DataFrame:
-    # Aggregate data
-    orig = data.groupby(['Country_Code_Origin', 'Region_Origin', 'Date', 'Travel_Type']) \
-        .agg({
-        'Sched_Flight_Count': np.sum,
-        'Cancellation_Count': np.sum
-    }) \
-        .reset_index()
-
-    dest = data.groupby(['Country_Code_Destination', 'Region_Destination', 'Date', 'Travel_Type']) \
-        .agg({
-        'Sched_Flight_Count': np.sum,
-        'Cancellation_Count': np.sum
-    }) \
-        .reset_index()
-
-    # Join data
-    joined = orig \
-        .merge(
-        dest,
-        how='outer',
-        left_on=['Country_Code_Origin', 'Region_Origin', 'Date', 'Travel_Type'],
-        right_on=['Country_Code_Destination', 'Region_Destination', 'Date', 'Travel_Type'],
-        suffixes=('_(Origin)', '_(Destination)')) \
-        .rename(columns={
-        'Country_Code_Origin': 'Country_Code',
-        'Region_Origin': 'Region'}) \
-        .drop(['Country_Code_Destination', 'Region_Destination'], axis=1)
+    # Aggregate data by origin country and date, with a column per travel type, in one groupby;
+    # destination totals never reached the output, so they are not computed
+    values = ['Sched_Flight_Count', 'Cancellation_Count']
+    pivot = data \
+        .groupby(['Country_Code_Origin', 'Region_Origin', 'Date', 'Travel_Type'])[values] \
+        .sum() \
+        .unstack('Travel_Type')
+    pivot.index.names = ['Country_Code', 'Region', 'Date']
 
     # Compute totals
-    joined['Sched_Flight_Count'] = joined['Sched_Flight_Count_(Origin)'] + joined[
-        'Sched_Flight_Count_(Destination)']
-    joined['Cancellation_Count'] = joined['Cancellation_Count_(Origin)'] + joined[
-        'Cancellation_Count_(Destination)']
-
-    # Pivot data
-    pivot = pd.pivot_table(
-        joined,
-        index=['Country_Code', 'Region', 'Date'],
-        columns=['Travel_Type'],
-        values=['Sched_Flight_Count_(Origin)', 'Cancellation_Count_(Origin)'],
-        aggfunc='sum'
-    )
-
-    pivot.columns = ['%s - %s' % (a, b) for a, b in pivot.columns]
+    totals = {value + '_(Origin)': pivot[value].sum(axis=1) for value in values}
 
-    # Compute totals
-    pivot['Sched_Flight_Count_(Origin)'] = pivot[
-        [col for col in pivot.columns if 'Sched_Flight_Count_(Origin)' in col]].sum(axis=1)
-    pivot['Cancellation_Count_(Origin)'] = pivot[
-        [col for col in pivot.columns if 'Cancellation_Count_(Origin)' in col]].sum(axis=1)
-    result = pivot.reset_index()
+    pivot = pivot[sorted(values)]
+    pivot.columns = ['%s_(Origin) - %s' % (a, b) for a, b in pivot.columns]
+    result = pivot.assign(**totals).reset_index()
 
     return result
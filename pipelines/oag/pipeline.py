@@ -64,7 +64,11 @@ def create_pipeline() -> Pipeline:
 	return Pipeline([
 			node(
 				nodes.load_latest_date_file,
-				"params:oag_data_folder_path",
+				[
+					"params:oag_data_folder_path",
+					"params:oag_state_folder_path",
+					"params:oag_all_snapshots"
+				],
 				"raw_oag_data"),
 			node(
 				nodes.previous_year_capacity,
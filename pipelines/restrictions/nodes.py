@@ -17,6 +17,8 @@ from typing import Any, Dict, Tuple
 # Import project utils
 from src.iata_covid import utils
 
+from ..common import geography
+
 # Create logger
 log = logging.getLogger(__name__)
 
@@ -142,36 +144,21 @@ def fetch_restrictions_matrix(
 
 
 def add_matrix_geographical_mappings(data: pd.DataFrame, country_mappings: pd.DataFrame) -> pd.DataFrame:
-	data = data \
-		.merge(
-			country_mappings[['code_2', 'code_3', 'country', 'region']],
-			how='left',
-			left_on='code_3_origin',
-			right_on='code_3') \
-		.drop(['code_3', 'code_3_origin'], axis=1) \
-		.rename(columns={'code_2': 'country_code_origin'}) \
-		.merge(
-			country_mappings[['code_2', 'code_3', 'country', 'region']],
-			how='left',
-			left_on='code_3_destination',
-			right_on='code_3',
-			suffixes=('_origin', '_destination')) \
-		.drop(['code_3', 'code_3_destination'], axis=1) \
-		.rename(columns={'code_2': 'country_code_destination'})
+	# Map 3-letter codes through the shared country dimension instead of merging
+	dimension = geography.CountryDimension(country_mappings, key='code_3')
+	for suffix in ('_origin', '_destination'):
+		dimension.add_attributes(
+			data, 'code_3' + suffix, {'code_2': 'country_code', 'country': 'country', 'region': 'region'}, suffix)
+	data = data.drop(['code_3_origin', 'code_3_destination'], axis=1)
 
 	# Domestic v. international
-	data['travel_type'] = np.where(
-		data['country_code_origin'] == data['country_code_destination'],
-		'Domestic',
-		np.where(
-			data['region_origin'] == data['region_destination'],
-			'Continental',
-			'Intercontinental'
-		))
+	data['travel_type'] = geography.classify_travel_type(
+		data['country_code_origin'], data['country_code_destination'],
+		data['region_origin'], data['region_destination'])
 
 	# Capitalize columns
 	data.columns = ['_'.join([word.capitalize() for word in col.split('_')]) for col in data.columns]
-	return data
+	return geography.materialize(data)
 
 
 def capture_restrictions_matrix_changes(
@@ -9,6 +9,7 @@ from rpy2 import robjects
 from rpy2.robjects import packages
 from typing import Any, Dict, List
 
+from ..common import geography
 
 # Create logger
 log = logging.getLogger(__name__)
@@ -180,11 +181,12 @@ def identify_change_points(data: pd.DataFrame, cpt_columns: List[str]) -> pd.Dat
 
 
 def add_geographical_mappings(data: pd.DataFrame, country_mappings: pd.DataFrame) -> pd.DataFrame:
-    country_mappings = country_mappings[['code_2', 'country', 'continent_code', 'continent', 'region']] \
-        .rename(columns={'code_2': 'country_code'})
+    # Look up the attributes in the shared country dimension instead of merging
+    dimension = geography.CountryDimension(country_mappings)
+    dimension.add_attributes(data, 'country_code', ['country', 'continent_code', 'continent', 'region'])
 
-    joined = data.merge(country_mappings, how='left', on='country_code')
-    return joined
+    # time_series_dataset is shared with other pipelines, so hand out plain strings
+    return geography.materialize(data)
 
 
 def compute_scorecard(data: pd.DataFrame, country_restrictions_matrix: pd.DataFrame) -> pd.DataFrame: